@@ -1,20 +1,37 @@
 import streamlit as st
 from googleapiclient.discovery import build
 from googleapiclient.discovery_cache.base import Cache
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
 import tempfile
 import ffmpeg
 
-# Disable the discovery cache warning
-class MemoryCache(Cache):
+# Discovery documents cached in memory and on disk, so a cold start doesn't
+# refetch them. Client versions that ship static discovery documents don't
+# fetch at all; this also disables the discovery cache warning.
+class DiscoveryCache(Cache):
     _CACHE = {}
 
+    def _path(self, url):
+        return os.path.join(DATA_DIR, 'discovery', hashlib.sha256(url.encode()).hexdigest() + '.json')
+
     def get(self, url):
-        return MemoryCache._CACHE.get(url)
+        content = DiscoveryCache._CACHE.get(url)
+        if content is None and os.path.exists(self._path(url)):
+            with open(self._path(url)) as f:
+                content = DiscoveryCache._CACHE[url] = f.read()
+        return content
 
     def set(self, url, content):
-        MemoryCache._CACHE[url] = content
+        DiscoveryCache._CACHE[url] = content
+        try:
+            os.makedirs(os.path.dirname(self._path(url)), exist_ok=True)
+            with open(self._path(url), 'w') as f:
+                f.write(content)
+        except OSError as e:
+            logger.warning(f"Could not persist discovery document: {str(e)}")
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import os
 import atexit
 import glob
@@ -24,16 +41,60 @@ import os
 import glob
 import atexit
 import logging as logger
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 import yt_dlp
 import json
+import hashlib
+import html
+import mimetypes
+import re
+import secrets
+import shutil
+import weakref
+import heapq
+import itertools
+import sqlite3
+import queue
+import io
+import urllib.request
+import random
+import sys
+import argparse
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows: the video cache is then only safe within one process
+    fcntl = None
+
+try:
+    from PIL import Image
+except ImportError:
+    # Without Pillow thumbnails are cached as-is instead of resized to WebP
+    Image = None
+
+try:
+    import resource
+except ImportError:
+    # Windows has no rusage; conversion CPU time is then reported as zero
+    resource = None
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    # Without OpenTelemetry, timers only feed the Prometheus histograms
+    otel_trace = None
 
 # Enhanced logger configuration
 logger.basicConfig(
     level=logger.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logger.FileHandler('youtube_app.log'),
+        logger.FileHandler(os.environ.get('CHUNTUBE_LOG_FILE', 'youtube_app.log')),
         logger.StreamHandler()
     ]
 )
@@ -68,387 +129,3322 @@ CUSTOM_CSS = """
 </style>
 """
 
-class TempFileManager:
-    """Enhanced temporary file manager with timed cleanup and individual file tracking"""
-    def __init__(self):
-        self.temp_dir = tempfile.mkdtemp(prefix='streamlit_youtube_')
-        # Dictionary to store file paths and their creation timestamps
-        self.active_files = {}
-        # Set cleanup interval (60 minutes in seconds)
-        self.cleanup_interval = 60 * 60
-        # Start the cleanup thread
-        self.cleanup_thread = threading.Thread(target=self._periodic_cleanup, daemon=True)
-        self.cleanup_thread.start()
-        atexit.register(self.cleanup_all)
-        logger.info(f"Initialized TempFileManager with directory: {self.temp_dir}")
-    
-    def create_temp_file(self, video_id):
-        temp_path = os.path.join(self.temp_dir, f"{video_id}.mp4")
-        # Store the file path with current timestamp
-        self.active_files[temp_path] = time.time()
-        logger.info(f"Created temporary file: {temp_path}")
-        return temp_path
-    
-    def cleanup_file(self, file_path):
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                # Remove from tracking dictionary
-                self.active_files.pop(file_path, None)
-                logger.info(f"Cleaned up file: {file_path}")
-        except Exception as e:
-            logger.error(f"Error cleaning up file {file_path}: {str(e)}")
-    
-    def _periodic_cleanup(self):
-        """Periodically check and clean files older than 15 minutes"""
-        while True:
-            current_time = time.time()
-            # Create a list of files to clean (avoid modifying dict during iteration)
-            files_to_clean = [
-                file_path
-                for file_path, timestamp in self.active_files.items()
-                if current_time - timestamp > self.cleanup_interval
-            ]
-            
-            # Clean up old files
-            for file_path in files_to_clean:
-                self.cleanup_file(file_path)
-            
-            # Sleep for a minute before next check
-            time.sleep(60)
-    
-    def cleanup_all(self):
-        """Clean up all files and stop the cleanup thread"""
-        # Clean up all tracked files
-        for file_path in list(self.active_files.keys()):
-            self.cleanup_file(file_path)
-        
-        try:
-            # Clean up any remaining files that might have been missed
-            remaining_files = glob.glob(os.path.join(self.temp_dir, "*"))
-            for file_path in remaining_files:
-                os.remove(file_path)
-                logger.info(f"Cleaned up remaining file: {file_path}")
-            
-            if os.path.exists(self.temp_dir):
-                os.rmdir(self.temp_dir)
-                logger.info(f"Cleaned up temporary directory: {self.temp_dir}")
-        except Exception as e:
-            logger.error(f"Error during cleanup: {str(e)}")
+# Small persistent state (API response cache and the like) lives here
+DATA_DIR = os.environ.get('CHUNTUBE_DATA_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'chuntube'))
+
+# Local media server settings. It listens on loopback unless
+# CHUNTUBE_MEDIA_HOST exposes it (it also serves /metrics, which includes
+# per-key quota), and browsers fetch media from it on the host they loaded
+# the app from. Browsers that can't reach it directly (another machine while
+# it is loopback-only, HTTPS, or a proxy in front of Streamlit) can't play or
+# download videos unless MEDIA_PUBLIC_URL says where a proxy exposes it
+# (e.g. https://example.com/media-proxy).
+MEDIA_SERVER_HOST = os.environ.get('CHUNTUBE_MEDIA_HOST', '127.0.0.1')
+MEDIA_SERVER_PORT = int(os.environ.get('CHUNTUBE_MEDIA_PORT', '8531'))
+MEDIA_PUBLIC_URL = os.environ.get('CHUNTUBE_MEDIA_URL')
+MEDIA_CHUNK_SIZE = 256 * 1024
+
+# Quality ladder, smallest first. Each preset has its yt-dlp format selector,
+# the selector progressive playback uses (None for audio), the container the
+# cached file is kept in, and a rough bitrate in bits per second that Auto
+# quality compares against the client's measured throughput. Progressive
+# playback hands the stream URLs to ffmpeg, so it can only use formats
+# delivered over plain HTTP(S) rather than DASH fragments.
+QUALITY_PRESETS = {
+    f'{height}p': {
+        'format': f'bestvideo[height<={height}][ext=mp4]+bestaudio[ext=m4a]/best[height<={height}][ext=mp4]',
+        'progressive_format': (
+            f'bestvideo[height<={height}][ext=mp4][protocol^=http][protocol!*=dash]'
+            '+bestaudio[ext=m4a][protocol^=http][protocol!*=dash]'
+            f'/best[height<={height}][ext=mp4][protocol^=http][protocol!*=dash]'
+        ),
+        'ext': 'mp4',
+        'bitrate': bitrate,
+        'audio_only': False,
+    }
+    for height, bitrate in (
+        (144, 150_000), (240, 300_000), (360, 700_000), (480, 1_200_000), (720, 2_500_000), (1080, 5_000_000)
+    )
+}
+QUALITY_PRESETS['Audio (m4a)'] = {
+    'format': 'bestaudio[ext=m4a]',
+    'progressive_format': None,
+    'ext': 'm4a',
+    'bitrate': 130_000,
+    'audio_only': True,
+}
+QUALITY_PRESETS['Audio (opus)'] = {
+    'format': 'bestaudio[acodec=opus][ext=webm]',
+    'progressive_format': None,
+    'ext': 'webm',
+    'bitrate': 130_000,
+    'audio_only': True,
+}
+DEFAULT_QUALITY = '720p'
+VIDEO_FORMAT = QUALITY_PRESETS[DEFAULT_QUALITY]['format']
+PROGRESSIVE_FORMAT = QUALITY_PRESETS[DEFAULT_QUALITY]['progressive_format']
+# Auto quality picks the best video preset whose bitrate, times this headroom,
+# fits in the client's throughput. It is measured on the first
+# THROUGHPUT_PROBE_BYTES of each video response (the burst that fills the
+# player's buffer; after that the browser reads at the video's bitrate), and
+# only if at least THROUGHPUT_MIN_BYTES of it were sent.
+QUALITY_HEADROOM = 1.5
+THROUGHPUT_MIN_BYTES = 1024 * 1024
+THROUGHPUT_PROBE_BYTES = 4 * 1024 * 1024
+THROUGHPUT_SMOOTHING = 0.3
+# Codec families browsers can play from an MP4 container; anything else is transcoded
+BROWSER_VIDEO_CODECS = ('avc1', 'h264', 'av01', 'av1', 'vp09', 'vp9')
+BROWSER_AUDIO_CODECS = ('mp4a', 'aac', 'opus', 'mp3')
+# Bytes of fragmented MP4 that must exist before the player is handed the URL
+PROGRESSIVE_MIN_BYTES = 512 * 1024
+PROGRESSIVE_START_TIMEOUT = 60
+
+# Shared video cache. Every session and every app process on the host uses the
+# same directory, so a video is downloaded once and then served to everybody.
+VIDEO_CACHE_DIR = os.environ.get('CHUNTUBE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'chuntube_cache'))
+VIDEO_CACHE_MAX_BYTES = int(os.environ.get('CHUNTUBE_CACHE_MAX_BYTES', 5 * 1024 ** 3))
+
+# Session scratch space: in-progress downloads with their .part files and
+# fragments, progressive remuxes and cookies. Leftovers of failed or cancelled
+# downloads are kept for TEMP_ARTIFACT_TTL so a retry can resume them, and all
+# of it stays under TEMP_MAX_BYTES. Directories of processes that died without
+# cleaning up are reclaimed at startup, by owner pid or, failing that, once
+# they are TEMP_ORPHAN_AGE old.
+TEMP_DIR_PREFIX = 'streamlit_youtube_'
+TEMP_MAX_BYTES = int(os.environ.get('CHUNTUBE_TEMP_MAX_BYTES', 4 * 1024 ** 3))
+TEMP_ARTIFACT_TTL = 30 * 60
+TEMP_ORPHAN_AGE = 24 * 60 * 60
+
+# YouTube Data API response cache. Responses are fresh for the per-endpoint
+# TTL (statistics get a short one), then served stale for up to
+# API_STALE_SECONDS while they are refreshed in the background.
+API_CACHE_PATH = os.environ.get('CHUNTUBE_API_CACHE', os.path.join(DATA_DIR, 'api_cache.sqlite3'))
+API_CACHE_MEMORY_ENTRIES = 512
+API_CACHE_TTLS = {
+    'search.list': 30 * 60,
+    'videos.list': 24 * 60 * 60,
+    'channels.list': 24 * 60 * 60,
+}
+API_STATISTICS_TTL = 10 * 60
+API_STALE_SECONDS = 24 * 60 * 60
+# Base URL of the YouTube Data API; point it at a local stand-in to benchmark without quota
+API_ENDPOINT = os.environ.get('CHUNTUBE_API_ENDPOINT')
+# Quota units each call costs, see https://developers.google.com/youtube/v3/determine_quota_cost
+API_QUOTA_COSTS = {'search.list': 100, 'videos.list': 1, 'channels.list': 1}
+# Daily quota per key (the default allocation; it resets at midnight Pacific
+# time) and keys to use when none is entered, comma separated
+API_DAILY_QUOTA = int(os.environ.get('CHUNTUBE_API_DAILY_QUOTA', 10_000))
+API_KEYS = os.environ.get('CHUNTUBE_API_KEYS', '')
+# Client-side rate limit across all keys: a token bucket refilled at
+# API_RATE_PER_SECOND requests that holds up to API_RATE_BURST. Responses with
+# a 5xx or 429 status are retried with exponential backoff and full jitter.
+API_RATE_PER_SECOND = 10
+API_RATE_BURST = 20
+API_MAX_RETRIES = 4
+API_BACKOFF_BASE = 0.5
+API_BACKOFF_MAX = 8
+
+# Local full-text index of every video and channel the app has fetched, so
+# searches can be answered without the API. Views and likes older than
+# INDEX_STATISTICS_MAX_AGE are refreshed with one videos.list call (1 quota
+# unit per 50 videos) before local results are shown.
+METADATA_INDEX_PATH = os.environ.get('CHUNTUBE_INDEX', os.path.join(DATA_DIR, 'metadata_index.sqlite3'))
+INDEX_STATISTICS_MAX_AGE = 24 * 60 * 60
+LOCAL_SEARCH_RESULTS = 12
+
+# Result cards are rendered to HTML once per result page and kept for this many pages
+RENDER_CACHE_PAGES = 64
+
+# Thumbnails are cached on disk, downsized to the width CUSTOM_CSS shows them at
+THUMBNAIL_DIR = os.path.join(DATA_DIR, 'thumbnails')
+THUMBNAIL_WIDTH = 240
+THUMBNAIL_FETCH_TIMEOUT = 10
+# Least recently shown thumbnails are evicted past this many bytes
+THUMBNAIL_MAX_BYTES = int(os.environ.get('CHUNTUBE_THUMBNAIL_MAX_BYTES', 256 * 1024 ** 2))
+
+# Results per page, and the most ids a single videos.list call accepts
+VIDEO_PAGE_SIZE = 4
+CHANNEL_VIDEO_PAGE_SIZE = 2
+VIDEOS_LIST_MAX_IDS = 50
+
+# Threads for issuing independent API calls concurrently, and how many idle
+# keep-alive connections to the API are kept around for them
+SEARCH_FANOUT_WORKERS = 8
+HTTP_POOL_SIZE = 16
+
+# Background download workers, and how many of them may pull from one host at once
+DOWNLOAD_WORKERS = int(os.environ.get('CHUNTUBE_DOWNLOAD_WORKERS', 4))
+DOWNLOAD_HOST_LIMIT = int(os.environ.get('CHUNTUBE_DOWNLOAD_HOST_LIMIT', 2))
+
+# Speculative prefetch of the top results into the video cache. Prefetches
+# queue behind every user request, leave one download slot per host (and one
+# worker) free for user requests, share PREFETCH_RATE_LIMIT bytes per second
+# across the whole process until someone asks for the video, skip anything
+# longer than PREFETCH_MAX_SECONDS, and may hold at most
+# PREFETCH_DISK_FRACTION of the video cache budget while nobody has watched them.
+PREFETCH_TOP_RESULTS = 2
+PREFETCH_PRIORITY = 10
+PREFETCH_RATE_LIMIT = int(os.environ.get('CHUNTUBE_PREFETCH_RATE_LIMIT', 2 * 1024 ** 2))
+PREFETCH_MAX_SECONDS = 10 * 60
+PREFETCH_DISK_FRACTION = 0.25
+# Latency histogram buckets in seconds for /metrics, and how many recent
+# samples per series the stats panel computes p50/p95 from
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRICS_WINDOW = 1000
+
+# Videos up to this length count as "short" in the playback timing report
+SHORT_VIDEO_SECONDS = 5 * 60
+
+class Metrics:
+    """Process-wide counters and latency histograms, exported in Prometheus text format.
+
+    A series is a metric name plus labels. Histograms also keep a window of
+    recent samples for the p50/p95 in the stats panel, and timers double as
+    OpenTelemetry spans when opentelemetry is installed. Collectors report
+    values that are cheaper to read at scrape time than to track, such as
+    disk usage or the counters other components already keep.
+    """
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = {}
+        self._tracer = otel_trace.get_tracer('chuntube') if otel_trace else None
+
+    @staticmethod
+    def _series(name, labels):
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        series = self._series(name, labels)
+        with self._lock:
+            self._counters[series] = self._counters.get(series, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        series = self._series(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(series)
+            if histogram is None:
+                histogram = self._histograms[series] = {
+                    'buckets': [0] * len(METRICS_BUCKETS), 'sum': 0.0, 'count': 0,
+                    'recent': deque(maxlen=self.window),
+                }
+            # Buckets are cumulative, as Prometheus expects
+            for i, bound in enumerate(METRICS_BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+            histogram['recent'].append(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Time the block into histogram name, inside an OpenTelemetry span of the same name"""
+        span = nullcontext()
+        if self._tracer:
+            span = self._tracer.start_as_current_span(
+                name, attributes={label: str(value) for label, value in labels.items()}
+            )
+        started_at = time.perf_counter()
+        with span:
+            try:
+                yield
+            finally:
+                self.observe(name, time.perf_counter() - started_at, **labels)
+
+    def register_collector(self, name, collect):
+        """collect() returns (metric, 'gauge' or 'counter', labels, value) tuples; name replaces an earlier one"""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def percentiles(self):
+        """p50/p95 of each histogram's recent samples, for the stats panel"""
+        with self._lock:
+            histograms = [(series, sorted(h['recent']), h['count']) for series, h in self._histograms.items()]
+        return [
+            {
+                'metric': name,
+                'labels': ', '.join(f"{label}={value}" for label, value in labels),
+                'count': count,
+                'p50_ms': round(recent[len(recent) // 2] * 1000, 1),
+                'p95_ms': round(recent[min(int(len(recent) * 0.95), len(recent) - 1)] * 1000, 1),
+            }
+            for (name, labels), recent, count in sorted(histograms)
+            if recent
+        ]
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        pairs = [*labels, *extra]
+        if not pairs:
+            return ''
+        escaped = (
+            f'{label}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+            for label, value in pairs
+        )
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self):
+        """All series in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {series: (list(h['buckets']), h['sum'], h['count']) for series, h in self._histograms.items()}
+            collectors = list(self._collectors.values())
+        
+        samples = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault((name, 'counter'), []).append((labels, value))
+        for collect in collectors:
+            try:
+                for name, kind, labels, value in collect():
+                    samples.setdefault((name, kind), []).append((self._series(name, labels)[1], value))
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+        
+        lines = []
+        for (name, kind), series in sorted(samples.items()):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{self._format_labels(labels)} {value}" for labels, value in sorted(series))
+        by_name = {}
+        for (name, labels), histogram in histograms.items():
+            by_name.setdefault(name, []).append((labels, histogram))
+        for name, series in sorted(by_name.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, (buckets, total, count) in sorted(series):
+                for bound, bucket_count in zip(METRICS_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{self._format_labels(labels, [('le', bound)])} {bucket_count}")
+                lines.append(f"{name}_bucket{self._format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {total}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+@st.cache_resource
+def get_metrics():
+    """The process-wide metrics registry"""
+    metrics = Metrics()
+    metrics.register_collector('temp_files', collect_temp_usage)
+    return metrics
+
+def stats_collector(metric, stats, label, names=None):
+    """Collector exporting entries of a component's stats dict as one labelled counter"""
+    return lambda: [
+        (metric, 'counter', {label: name}, value)
+        for name, value in list(stats.items())
+        if names is None or name in names
+    ]
+
+def directory_bytes(directory):
+    """Total size of the files directly inside directory"""
+    total = 0
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            total += entry.stat().st_size
+        except OSError:
+            pass
+    return total
+
+def glob_bytes(pattern):
+    total = 0
+    for file_path in glob.glob(pattern):
+        try:
+            total += os.path.getsize(file_path)
+        except OSError:
+            pass
+    return total
+
+def collect_temp_usage():
+    """Bytes held in session scratch directories, across every process on the host"""
+    total = sum(
+        directory_bytes(directory)
+        for directory in glob.glob(os.path.join(tempfile.gettempdir(), f'{TEMP_DIR_PREFIX}*'))
+    )
+    return [('chuntube_temp_bytes', 'gauge', {}, total)]
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Someone else's process
+        return True
+    return True
+
+class ScratchSpaceExhausted(Exception):
+    """A download doesn't fit in the scratch budget even after evicting every idle leftover"""
+
+class ScratchStorage:
+    """Process-wide bookkeeping for what sessions write to their scratch directories.
+
+    An artifact is a glob pattern covering every file of one download (the
+    .part file, separate .fNNN video and audio streams, merged and converted
+    outputs). Pinned artifacts are in use; once unpinned they expire after
+    ttl, so a retry can still resume the .part files. A janitor thread
+    sleeps on a condition variable until the earliest expiry in a min-heap
+    or until an artifact changes, instead of polling. Whenever the total
+    goes over max_bytes, idle artifacts are evicted, soonest to expire first.
+    """
+    def __init__(self, root=None, max_bytes=TEMP_MAX_BYTES, ttl=TEMP_ARTIFACT_TTL):
+        self.root = root or tempfile.gettempdir()
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._cond = threading.Condition()
+        # pattern -> {'pins', 'reserved', 'expires_at'}; expires_at is None while pinned
+        self._artifacts = {}
+        # (expires_at, sequence, pattern); an entry is stale once the artifact's expiry differs
+        self._expiries = []
+        self._sequence = itertools.count()
+        self.stats = {'expired': 0, 'evicted': 0, 'refused': 0, 'reclaimed_dirs': 0, 'reclaimed_bytes': 0}
+        self.reclaim_orphans()
+        threading.Thread(target=self._janitor, name='scratch-janitor', daemon=True).start()
+
+    def make_dir(self):
+        # The owner's pid in the name lets later processes tell whether the directory is orphaned
+        return tempfile.mkdtemp(prefix=f'{TEMP_DIR_PREFIX}{os.getpid()}_', dir=self.root)
+
+    def reclaim_orphans(self):
+        """Delete scratch directories left behind by processes that died without cleaning up"""
+        for directory in glob.glob(os.path.join(self.root, f'{TEMP_DIR_PREFIX}*')):
+            owner = re.match(rf'{TEMP_DIR_PREFIX}(\d+)_', os.path.basename(directory))
+            if owner and os.name == 'posix':
+                pid = int(owner.group(1))
+                if pid == os.getpid() or pid_alive(pid):
+                    continue
+            else:
+                # No usable owner pid (older directories, or no way to probe it): go by age
+                try:
+                    if time.time() - os.path.getmtime(directory) < TEMP_ORPHAN_AGE:
+                        continue
+                except OSError:
+                    continue
+            size = directory_bytes(directory)
+            shutil.rmtree(directory, ignore_errors=True)
+            self.stats['reclaimed_dirs'] += 1
+            self.stats['reclaimed_bytes'] += size
+            logger.info(f"Reclaimed orphaned scratch directory {directory} ({size} bytes)")
+
+    def pin(self, pattern):
+        """Mark an artifact as in use; pinned artifacts never expire or get evicted"""
+        with self._cond:
+            artifact = self._artifacts.setdefault(pattern, {'pins': 0, 'reserved': 0, 'expires_at': None})
+            artifact['pins'] += 1
+            artifact['expires_at'] = None
+
+    def unpin(self, pattern):
+        with self._cond:
+            artifact = self._artifacts.get(pattern)
+            if artifact is None:
+                return
+            artifact['pins'] -= 1
+            if artifact['pins'] == 0:
+                artifact['reserved'] = 0
+                artifact['expires_at'] = time.time() + self.ttl
+                heapq.heappush(self._expiries, (artifact['expires_at'], next(self._sequence), pattern))
+                self._cond.notify()
+
+    def reserve(self, pattern, expected_bytes):
+        """Count a pinned artifact as expected_bytes from now on, evicting idle ones to make room.
+
+        Raises ScratchSpaceExhausted when it can't fit next to the artifacts in use.
+        """
+        with self._cond:
+            artifact = self._artifacts[pattern]
+            artifact['reserved'] = expected_bytes
+            if not self._make_room():
+                artifact['reserved'] = 0
+                self.stats['refused'] += 1
+                raise ScratchSpaceExhausted(
+                    f"Needs {expected_bytes / 1024 ** 2:.0f} MiB of scratch space, but downloads in progress "
+                    f"hold most of the {self.max_bytes / 1024 ** 2:.0f} MiB budget"
+                )
+
+    def forget(self, pattern):
+        """Delete an artifact's files now and stop tracking it"""
+        with self._cond:
+            self._artifacts.pop(pattern, None)
+            self._delete(pattern)
+
+    def remove_dir(self, directory):
+        """Delete a session's scratch directory along with everything tracked in it"""
+        with self._cond:
+            escaped = glob.escape(directory)
+            for pattern in [pattern for pattern in self._artifacts if os.path.dirname(pattern) == escaped]:
+                del self._artifacts[pattern]
+        shutil.rmtree(directory, ignore_errors=True)
+        logger.info(f"Cleaned up temporary directory: {directory}")
+
+    def usage(self):
+        with self._cond:
+            return {'artifacts': len(self._artifacts), 'bytes': self._usage(), 'max_bytes': self.max_bytes}
+
+    def _usage(self):
+        # Downloads in progress count as what they are expected to grow to
+        return sum(max(glob_bytes(pattern), artifact['reserved']) for pattern, artifact in self._artifacts.items())
+
+    def _make_room(self):
+        """Evict idle artifacts, soonest to expire first, until the total fits; returns whether it does"""
+        usage = self._usage()
+        for expires_at, _, pattern in sorted(self._expiries):
+            if usage <= self.max_bytes:
+                break
+            artifact = self._artifacts.get(pattern)
+            if artifact is None or artifact['expires_at'] != expires_at:
+                continue
+            usage -= glob_bytes(pattern)
+            self._remove(pattern, 'evicted')
+        return usage <= self.max_bytes
+
+    def _remove(self, pattern, reason):
+        # Caller holds self._cond
+        del self._artifacts[pattern]
+        self._delete(pattern)
+        self.stats[reason] += 1
+        logger.info(f"Removed {reason} scratch files {pattern}")
+
+    @staticmethod
+    def _delete(pattern):
+        for file_path in glob.glob(pattern):
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                logger.error(f"Error cleaning up file {file_path}: {str(e)}")
+
+    def _janitor(self):
+        with self._cond:
+            while True:
+                now = time.time()
+                while self._expiries and self._expiries[0][0] <= now:
+                    expires_at, _, pattern = heapq.heappop(self._expiries)
+                    artifact = self._artifacts.get(pattern)
+                    if artifact is not None and artifact['expires_at'] == expires_at:
+                        self._remove(pattern, 'expired')
+                self._make_room()
+                self._cond.wait(self._expiries[0][0] - now if self._expiries else None)
+
+@st.cache_resource
+def get_scratch_storage():
+    """Scratch bookkeeping shared by every session; creating it reclaims directories of crashed processes"""
+    storage = ScratchStorage()
+    get_metrics().register_collector('scratch', stats_collector('chuntube_temp_events_total', storage.stats, 'event'))
+    return storage
+
+class TempFileManager:
+    """Per-session scratch directory for cookies, in-progress downloads and remuxes.
+
+    Finished videos move into the shared VideoCache. Whatever stays behind is
+    tracked by the process-wide ScratchStorage, which expires it and keeps it
+    under the disk budget; the directory itself goes when the session is
+    garbage collected or the process exits.
+    """
+    def __init__(self, storage=None):
+        self.storage = storage or get_scratch_storage()
+        self.temp_dir = self.storage.make_dir()
+        # Patterns of files created with create_temp_file, pinned until cleaned up
+        self.active_files = set()
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, self.storage.remove_dir, self.temp_dir)
+        logger.info(f"Initialized TempFileManager with directory: {self.temp_dir}")
+
+    def artifact_pattern(self, video_id):
+        """Glob matching every file yt-dlp writes for video_id"""
+        return os.path.join(glob.escape(self.temp_dir), f"{glob.escape(video_id)}.*")
+
+    @contextmanager
+    def hold(self, video_id):
+        """Pin a download's files while it runs; afterwards leftovers expire unless it is retried"""
+        pattern = self.artifact_pattern(video_id)
+        self.storage.pin(pattern)
+        try:
+            yield pattern
+        finally:
+            self.storage.unpin(pattern)
+
+    def reserve(self, video_id, expected_bytes):
+        """Claim scratch space for a held download; raises ScratchSpaceExhausted if it can't fit"""
+        self.storage.reserve(self.artifact_pattern(video_id), expected_bytes)
+
+    def create_temp_file(self, name, ext='mp4'):
+        """Path for a file written outside yt-dlp, kept until cleanup_file or the end of the session"""
+        temp_path = os.path.join(self.temp_dir, f"{name}.{ext}")
+        with self._lock:
+            if temp_path not in self.active_files:
+                self.active_files.add(temp_path)
+                self.storage.pin(glob.escape(temp_path))
+        logger.info(f"Created temporary file: {temp_path}")
+        return temp_path
+
+    def cleanup_file(self, file_path):
+        with self._lock:
+            self.active_files.discard(file_path)
+        self.storage.forget(glob.escape(file_path))
+        logger.info(f"Cleaned up file: {file_path}")
+
+    def cleanup_all(self):
+        """Clean up all files and the temporary directory"""
+        self._finalizer()
+
+class VideoCache:
+    """Content-addressed video cache shared by every session, with LRU eviction under a byte budget.
+
+    Entries are keyed by video_id plus a format variant. Entries that a session
+    holds a reference to are never evicted; the same guarantee holds across
+    processes sharing the directory through shared/exclusive locks on a
+    per-entry lock file.
+    """
+    def __init__(self, cache_dir=VIDEO_CACHE_DIR, max_bytes=VIDEO_CACHE_MAX_BYTES, metrics=None):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        # Entry path -> [reference count, open lock file holding a shared flock]
+        self._refs = {}
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'evicted_bytes': 0}
+        self.metrics = metrics or get_metrics()
+        self.metrics.register_collector('video_cache', self.collect)
+        logger.info(f"Initialized VideoCache in {self.cache_dir} with a {self.max_bytes} byte budget")
+
+    @staticmethod
+    def cache_variant(format_selector, cookies_path=None, section=None):
+        """Cache variant for a download; videos fetched with cookies are only shared with the same cookies.
+
+        A clip (section, a (start, end) pair in seconds) is cached apart
+        from the full video and from other clips of it.
+        """
+        variant = format_selector
+        if cookies_path and os.path.exists(cookies_path):
+            with open(cookies_path, 'rb') as f:
+                variant = f"{variant}|cookies:{hashlib.sha256(f.read()).hexdigest()}"
+        if section:
+            variant = f"{variant}|clip:{section[0]:g}-{section[1]:g}"
+        return variant
+
+    def entry_path(self, video_id, variant, ext='mp4'):
+        key = hashlib.sha256(f"{video_id}|{variant}".encode()).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{key}.{ext}")
+
+    def owns(self, file_path):
+        return os.path.dirname(os.path.abspath(file_path)) == self.cache_dir
+
+    def contains(self, video_id, variant, ext='mp4'):
+        return os.path.exists(self.entry_path(video_id, variant, ext))
+
+    def lookup(self, video_id, variant, ext='mp4'):
+        """Return the cached file for video_id/variant, or None on a miss"""
+        entry = self.entry_path(video_id, variant, ext)
+        with self.metrics.timer('chuntube_cache_io_seconds', op='lookup'), self._lock:
+            try:
+                # Bump the mtime: it is the LRU clock every process agrees on
+                os.utime(entry)
+            except OSError:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+        return entry
+
+    def commit(self, video_id, variant, source_path, ext='mp4'):
+        """Move a finished download into the cache and return its cache path"""
+        entry = self.entry_path(video_id, variant, ext)
+        staging = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        # Move to a temporary name first so the final rename is atomic even
+        # when the download directory lives on another filesystem
+        with self.metrics.timer('chuntube_cache_io_seconds', op='commit'):
+            shutil.move(source_path, staging)
+            os.replace(staging, entry)
+        logger.info(f"Cached video {video_id} at {entry} ({os.path.getsize(entry)} bytes)")
+        self.evict_to_budget(keep=entry)
+        return entry
+
+    def acquire(self, file_path):
+        """Pin a cache entry so it isn't evicted while it is being served.
+
+        Returns False, holding nothing, if the entry has been evicted (for
+        example between a lookup and this call).
+        """
+        with self._lock:
+            ref = self._refs.get(file_path)
+            if ref:
+                ref[0] += 1
+                return True
+            lock_path = f"{file_path}.lock"
+            while True:
+                lock_file = open(lock_path, 'a')
+                if not fcntl:
+                    break
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+                # An evicting process may have unlinked the lock file while we
+                # waited: a lock on that inode protects nothing, so start over
+                # with whatever is at the path now
+                if self._is_current(lock_file, lock_path):
+                    break
+                lock_file.close()
+            if not os.path.exists(file_path):
+                lock_file.close()
+                return False
+            self._refs[file_path] = [1, lock_file]
+            return True
+
+    @staticmethod
+    def _is_current(lock_file, lock_path):
+        """Whether the open lock_file is still the one at lock_path"""
+        try:
+            return os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino
+        except OSError:
+            return False
+
+    def release(self, file_path):
+        with self._lock:
+            ref = self._refs.get(file_path)
+            if not ref:
+                return
+            ref[0] -= 1
+            if ref[0] == 0:
+                del self._refs[file_path]
+                ref[1].close()
+
+    def release_all(self, file_paths):
+        for file_path in list(file_paths):
+            self.release(file_path)
+
+    def _entries(self):
+        entries = []
+        for file_path in glob.glob(os.path.join(self.cache_dir, '*.*')):
+            if file_path.endswith(('.lock', '.tmp')):
+                continue
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                continue
+            entries.append((file_stat.st_mtime, file_stat.st_size, file_path))
+        return entries
+
+    def usage(self):
+        entries = self._entries()
+        return {'entries': len(entries), 'bytes': sum(size for _, size, _ in entries), 'max_bytes': self.max_bytes}
+
+    def collect(self):
+        usage = self.usage()
+        return [
+            ('chuntube_video_cache_bytes', 'gauge', {}, usage['bytes']),
+            ('chuntube_video_cache_entries', 'gauge', {}, usage['entries']),
+            ('chuntube_video_cache_lookups_total', 'counter', {'result': 'hit'}, self.stats['hits']),
+            ('chuntube_video_cache_lookups_total', 'counter', {'result': 'miss'}, self.stats['misses']),
+            ('chuntube_video_cache_evictions_total', 'counter', {}, self.stats['evictions']),
+            ('chuntube_video_cache_evicted_bytes_total', 'counter', {}, self.stats['evicted_bytes']),
+        ]
+
+    @contextmanager
+    def _exclusive(self, lock_path, blocking=True):
+        """Hold an exclusive flock on lock_path; yields False if it is held elsewhere and blocking is off.
+
+        Also yields False if the lock file was unlinked before the lock was
+        taken, since readers pin the file at the path, not this one.
+        """
+        with open(lock_path, 'a') as lock_file:
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+                if not self._is_current(lock_file, lock_path):
+                    yield False
+                    return
+            yield True
+
+    def evict_to_budget(self, keep=None):
+        """Evict least recently used entries until the cache fits its byte budget"""
+        with self._lock, self._exclusive(os.path.join(self.cache_dir, '.lock')):
+            # The directory, not an in-memory index, is the source of truth so
+            # entries written by other processes are accounted for too
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, file_path in entries:
+                if total <= self.max_bytes:
+                    break
+                if file_path == keep or file_path in self._refs:
+                    continue
+                with self._exclusive(f"{file_path}.lock", blocking=False) as unused:
+                    # Another process holds a shared lock: the entry is being served
+                    if not unused:
+                        continue
+                    try:
+                        os.remove(file_path)
+                        os.remove(f"{file_path}.lock")
+                    except OSError as e:
+                        logger.error(f"Error evicting {file_path}: {str(e)}")
+                        continue
+                total -= size
+                self.stats['evictions'] += 1
+                self.stats['evicted_bytes'] += size
+                logger.info(f"Evicted {file_path} ({size} bytes) from video cache")
+
+class CacheLease:
+    """A session's references into the video cache, released when the session goes away"""
+    def __init__(self, video_cache):
+        self.video_cache = video_cache
+        self.paths = []
+        # Streamlit has no session-end hook, but the session state holding this
+        # lease is dropped with the session, which runs the finalizer
+        weakref.finalize(self, video_cache.release_all, self.paths)
+
+    def acquire(self, file_path):
+        """Pin file_path for this session; returns False if it has been evicted"""
+        if not self.video_cache.acquire(file_path):
+            return False
+        self.paths.append(file_path)
+        return True
+
+    def release(self, file_path):
+        if file_path in self.paths:
+            self.paths.remove(file_path)
+            self.video_cache.release(file_path)
+
+@st.cache_resource
+def get_video_cache():
+    """Create the video cache once per process and share it across sessions"""
+    return VideoCache()
+
+def parse_range_header(range_header, file_size):
+    """Parse a single-range HTTP Range header into an inclusive (start, end) tuple.
+
+    Returns None when the header is absent or should be ignored (malformed or
+    multi-range), and raises ValueError when the range cannot be satisfied.
+    """
+    if not range_header:
+        return None
+    match = re.fullmatch(r'\s*bytes=(\d*)-(\d*)\s*', range_header)
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+
+    start, end = match.groups()
+    if start == '':
+        # Suffix range: the last N bytes of the file
+        length = int(end)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(file_size - length, 0), file_size - 1
+
+    start = int(start)
+    end = int(end) if end else file_size - 1
+    if start >= file_size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, file_size - 1)
+
+def safe_filename(title, ext, max_length=150):
+    """Turn a video title into a file name that is valid on every common OS"""
+    name = re.sub(r'[\x00-\x1f\x7f<>:"/\\|?*]', '', title or '')
+    name = re.sub(r'\s+', ' ', name).strip(' .')[:max_length].rstrip(' .')
+    return f"{name or 'video'}.{ext}"
+
+def content_disposition(filename):
+    """attachment header value with an ASCII fallback and the exact UTF-8 name (RFC 6266)"""
+    fallback = filename.encode('ascii', 'replace').decode('ascii').replace('?', '_')
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    """Serve published media files with HTTP Range support and zero-copy reads"""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ChunTubeMedia/1.0'
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _serve(self, send_body):
+        if urlparse(self.path).path == '/metrics':
+            self._send_metrics(send_body)
+            return
+        entry = self.server.media_server.resolve(self.path)
+        if entry is None:
+            self.send_error(404, "Media not found")
+            return
+        file_path, is_growing, kind = entry
+
+        try:
+            media_file = open(file_path, 'rb')
+        except OSError:
+            self.send_error(404, "Media not found")
+            return
+
+        with media_file:
+            if is_growing is not None and is_growing():
+                self._send_growing_file(media_file, file_path, is_growing, send_body)
+                return
+
+            file_stat = os.fstat(media_file.fileno())
+            file_size = file_stat.st_size
+            # Published files never change in place (the cache replaces them
+            # atomically), so size and inode make a strong validator for
+            # resuming interrupted downloads
+            etag = f'"{file_stat.st_ino:x}-{file_size:x}"'
+            if_range = self.headers.get('If-Range')
+            try:
+                if if_range and if_range != etag:
+                    byte_range = None
+                else:
+                    byte_range = parse_range_header(self.headers.get('Range'), file_size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{file_size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            start, end = byte_range or (0, file_size - 1)
+            length = end - start + 1 if file_size else 0
+
+            self.send_response(206 if byte_range else 200)
+            self.send_header('Content-Type', mimetypes.guess_type(file_path)[0] or 'application/octet-stream')
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Length', str(length))
+            self.send_header('Cache-Control', 'private, max-age=3600')
+            self.send_header('ETag', etag)
+            query = parse_qs(urlparse(self.path).query)
+            if 'download' in query:
+                ext = os.path.splitext(file_path)[1].lstrip('.') or 'mp4'
+                self.send_header('Content-Disposition', content_disposition(safe_filename(query['download'][0], ext)))
+            if byte_range:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{file_size}')
+            self.end_headers()
+
+            if send_body and length:
+                self._send_file(media_file, start, length, kind)
+
+    def _send_metrics(self, send_body):
+        body = self.server.media_server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_growing_file(self, media_file, file_path, is_growing, send_body):
+        """Stream a file that is still being written, following it until the writer finishes"""
+        # The final length is unknown, so Range is ignored and the body is
+        # delimited by closing the connection
+        self.send_response(200)
+        self.send_header('Content-Type', mimetypes.guess_type(file_path)[0] or 'application/octet-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        if not send_body:
+            return
+
+        try:
+            while True:
+                # Sample the writer state before reading so the final bytes are never missed
+                growing = is_growing()
+                chunk = media_file.read(MEDIA_CHUNK_SIZE)
+                if chunk:
+                    self.wfile.write(chunk)
+                    self.server.media_server.record_sent('video', len(chunk), 'growing')
+                elif growing:
+                    time.sleep(0.2)
+                else:
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_file(self, media_file, offset, count, kind):
+        """Copy a file region to the socket, using sendfile() where the OS supports it.
+
+        Client throughput is timed over the first THROUGHPUT_PROBE_BYTES only,
+        so it reflects the link rather than the playback speed of the video.
+        """
+        sent = 0
+        try:
+            self.wfile.flush()
+            probe = min(count, THROUGHPUT_PROBE_BYTES)
+            started = time.monotonic()
+            sent = self.connection.sendfile(media_file, offset, probe)
+            if kind == 'video' and sent >= THROUGHPUT_MIN_BYTES:
+                self.server.media_server.record_throughput(self.client_ip(), sent, time.monotonic() - started)
+            if sent == probe < count:
+                sent += self.connection.sendfile(media_file, offset + probe, count - probe)
+        except (BrokenPipeError, ConnectionResetError):
+            # Browsers routinely abort requests when the user seeks
+            self.close_connection = True
+        self.server.media_server.record_sent(kind, sent, 'file')
+
+    def client_ip(self):
+        forwarded = self.headers.get('X-Forwarded-For')
+        return forwarded.split(',')[0].strip() if forwarded else self.client_address[0]
+
+    def log_message(self, format, *args):
+        logger.debug(f"Media server: {self.address_string()} {format % args}")
+
+class MediaServer:
+    """Process-wide HTTP server that streams published files straight from disk"""
+    def __init__(self, host=MEDIA_SERVER_HOST, port=MEDIA_SERVER_PORT, public_url=MEDIA_PUBLIC_URL, metrics=None):
+        self.metrics = metrics or get_metrics()
+        try:
+            self.httpd = ThreadingHTTPServer((host, port), MediaRequestHandler)
+        except OSError as e:
+            # Another app instance has the port; browsers on this machine can still use any port
+            logger.warning(f"Media server port {port} unavailable ({str(e)}), using a free port instead")
+            self.httpd = ThreadingHTTPServer((host, 0), MediaRequestHandler)
+        self.httpd.media_server = self
+        self.host = host
+        self.port = self.httpd.server_address[1]
+        # A configured public URL is used for every browser; otherwise URLs are built per browser
+        self.configured_url = public_url.rstrip('/') if public_url else None
+        public_host = 'localhost' if host in ('', '0.0.0.0', '::') else host
+        self.public_url = self.configured_url or f"http://{public_host}:{self.port}"
+        # Only files explicitly published get a token, and only tokens are served.
+        # Tokens map to (path, is_growing, kind) where is_growing is None for
+        # finished files and kind ('video' or 'thumbnail') labels bytes sent.
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._paths = {}
+        # Client IP -> smoothed throughput in bits per second, plus one across all clients
+        self._throughput = {}
+        self._overall_throughput = None
+        self.bytes_sent = {}
+        self.server_thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.server_thread.start()
+        atexit.register(self.shutdown)
+        logger.info(f"Media server listening on {host}:{self.port}, public URL {self.public_url}")
+
+    def record_throughput(self, client, sent_bytes, seconds):
+        bits_per_second = sent_bytes * 8 / max(seconds, 1e-3)
+        with self._lock:
+            for key in (client, None):
+                previous = self._throughput.get(key) if key else self._overall_throughput
+                smoothed = bits_per_second if previous is None else (
+                    THROUGHPUT_SMOOTHING * bits_per_second + (1 - THROUGHPUT_SMOOTHING) * previous
+                )
+                if key:
+                    self._throughput[key] = smoothed
+                else:
+                    self._overall_throughput = smoothed
+
+    def record_sent(self, kind, sent_bytes, mode):
+        self.metrics.inc('chuntube_media_bytes_sent_total', sent_bytes, mode=mode, kind=kind)
+        with self._lock:
+            self.bytes_sent[kind] = self.bytes_sent.get(kind, 0) + sent_bytes
+
+    def throughput(self, client=None):
+        """Smoothed bits per second the client has been pulling media at, falling back to all clients"""
+        with self._lock:
+            return self._throughput.get(client) or self._overall_throughput
+
+    @property
+    def loopback_only(self):
+        return self.host in ('localhost', '::1') or self.host.startswith('127.')
+
+    def url_for_browser(self, browser_url, headers):
+        """Base URL a browser that loaded the app from browser_url can reach this server at.
+
+        None means it can't fetch from here directly: the page is served
+        over HTTPS (plain HTTP media would be blocked as mixed content),
+        through a proxy that only forwards Streamlit's port, or from another
+        machine while this server only listens on loopback.
+        """
+        if self.configured_url:
+            return self.configured_url
+        if any(name in headers for name in ('X-Forwarded-For', 'X-Forwarded-Host', 'Forwarded')):
+            return None
+        page = urlparse(browser_url or f"http://{headers.get('Host', '')}")
+        hostname = page.hostname
+        if page.scheme != 'http' or not hostname:
+            return None
+        if self.loopback_only and hostname not in ('localhost', '::1') and not hostname.startswith('127.'):
+            return None
+        return f"http://{f'[{hostname}]' if ':' in hostname else hostname}:{self.port}"
+
+    def publish(self, file_path, is_growing=None, download_name=None, base_url=None, kind='video'):
+        """Return a URL the browser can use to fetch file_path.
+
+        is_growing is an optional callable that returns True while the file is
+        still being written; such files are streamed as they grow. With a
+        download_name the URL makes the browser save the file under that
+        name (sanitized) instead of playing it. base_url defaults to
+        public_url; url_for_browser gives the right one for a browser.
+        """
+        file_path = os.path.abspath(file_path)
+        with self._lock:
+            token = self._paths.get(file_path)
+            if token is None:
+                token = secrets.token_urlsafe(16)
+                self._paths[file_path] = token
+            self._tokens[token] = (file_path, is_growing, kind)
+        url = f"{base_url or self.public_url}/media/{token}/{quote(os.path.basename(file_path))}"
+        if download_name:
+            url += f"?download={quote(download_name, safe='')}"
+        return url
+
+    def revoke(self, file_path):
+        """Stop serving file_path; requests already in flight finish normally"""
+        with self._lock:
+            token = self._paths.pop(os.path.abspath(file_path), None)
+            if token:
+                self._tokens.pop(token, None)
+
+    def relink(self, old_path, new_path):
+        """Point the URL published for old_path at the finished file at new_path"""
+        with self._lock:
+            token = self._paths.pop(os.path.abspath(old_path), None)
+            if token:
+                self._paths[os.path.abspath(new_path)] = token
+                self._tokens[token] = (os.path.abspath(new_path), None, self._tokens[token][2])
+
+    def resolve(self, request_path):
+        """Map a request path to the published file it refers to"""
+        parts = unquote(urlparse(request_path).path).split('/')
+        if len(parts) < 3 or parts[1] != 'media':
+            return None
+        with self._lock:
+            return self._tokens.get(parts[2])
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@st.cache_resource
+def get_media_server():
+    """Start the media server once per process and share it across sessions"""
+    return MediaServer()
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into a single execution.
+
+    The first caller runs the function; callers that arrive while it is in
+    flight wait for it and receive the same result or exception.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {'executions': 0, 'coalesced': 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+                self.stats['executions'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            logger.info(f"Joining in-flight call for {key}")
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+@st.cache_resource
+def get_download_flights():
+    """One download coordinator per process, so sessions share in-flight downloads"""
+    return SingleFlight()
+
+def _codec_family(codec, families):
+    codec = (codec or '').lower()
+    return next((family for family in families if codec.startswith(family)), None)
+
+def negotiate_conversion(info_dict):
+    """Pick the cheapest way to turn the selected formats into a browser-playable MP4.
+
+    Returns 'copy' when the merged file can be served as is, 'remux' when only
+    the container needs changing, 'transcode' when a codec has to be
+    re-encoded, or None when the extractor didn't report codecs.
+    """
+    formats = info_dict.get('requested_formats') or [info_dict]
+    codecs = []
+    for fmt in formats:
+        for codec_field in ('vcodec', 'acodec'):
+            codec = fmt.get(codec_field)
+            if codec and codec != 'none':
+                codecs.append((codec_field, codec))
+    if not codecs:
+        return None
+
+    for codec_field, codec in codecs:
+        families = BROWSER_VIDEO_CODECS if codec_field == 'vcodec' else BROWSER_AUDIO_CODECS
+        if not _codec_family(codec, families):
+            return 'transcode'
+    # yt-dlp merges separate streams into MP4 with a stream copy
+    return 'copy' if info_dict.get('ext') == 'mp4' else 'remux'
+
+def probe_conversion(video_path):
+    """Like negotiate_conversion, but decided from the downloaded file with ffprobe"""
+    probe = ffmpeg.probe(video_path)
+    for stream in probe['streams']:
+        if stream['codec_type'] == 'video' and stream.get('disposition', {}).get('attached_pic'):
+            continue
+        families = {'video': BROWSER_VIDEO_CODECS, 'audio': BROWSER_AUDIO_CODECS}.get(stream['codec_type'])
+        if families and not _codec_family(stream.get('codec_name'), families):
+            return 'transcode'
+    return 'copy' if 'mp4' in probe['format']['format_name'] else 'remux'
+
+def convert_to_mp4(video_path, strategy):
+    """Apply a negotiated conversion and return the path of the resulting MP4"""
+    if strategy == 'copy':
+        return video_path
+    
+    output_path = f"{os.path.splitext(video_path)[0]}.converted.mp4"
+    if strategy == 'remux':
+        output = ffmpeg.input(video_path).output(output_path, c='copy', movflags='+faststart')
+    else:
+        output = ffmpeg.input(video_path).output(
+            output_path, vcodec='libx264', preset='veryfast', acodec='aac', movflags='+faststart'
+        )
+    output.global_args('-loglevel', 'error').overwrite_output().run(capture_stdout=True, capture_stderr=True)
+    os.remove(video_path)
+    return output_path
+
+def child_cpu_seconds():
+    """CPU time used by finished child processes (ffmpeg), or 0 where rusage is unavailable"""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class ConversionStats:
+    """Videos and CPU seconds spent per conversion strategy"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = {}
+
+    def record(self, strategy, cpu_seconds):
+        with self._lock:
+            videos, total_cpu = self.totals.get(strategy, (0, 0.0))
+            self.totals[strategy] = (videos + 1, total_cpu + cpu_seconds)
+
+    def summary(self):
+        with self._lock:
+            return [
+                {
+                    'strategy': strategy,
+                    'videos': videos,
+                    'CPU seconds per video': round(total_cpu / videos, 2),
+                }
+                for strategy, (videos, total_cpu) in sorted(self.totals.items())
+            ]
+
+@st.cache_resource
+def get_conversion_stats():
+    return ConversionStats()
+
+def parse_timestamp(text):
+    """Seconds in a timestamp written as 90, 1:30 or 1:02:03"""
+    parts = text.strip().split(':')
+    if not 1 <= len(parts) <= 3:
+        raise ValueError(f"'{text}' is not a timestamp")
+    try:
+        values = [float(part) for part in parts]
+    except ValueError:
+        raise ValueError(f"'{text}' is not a timestamp") from None
+    if any(value < 0 for value in values) or any(value >= 60 for value in values[1:]):
+        raise ValueError(f"'{text}' is not a timestamp")
+    seconds = 0.0
+    for value in values:
+        seconds = seconds * 60 + value
+    return seconds
+
+def parse_clip(text):
+    """(start, end) seconds of a clip written as START-END, e.g. 1:30-4:00; None if text is blank"""
+    if not text or not text.strip():
+        return None
+    start, sep, end = text.partition('-')
+    if not sep:
+        raise ValueError("Write the clip as START-END, for example 1:30-4:00")
+    section = (parse_timestamp(start), parse_timestamp(end))
+    if section[1] <= section[0]:
+        raise ValueError("The clip has to end after it starts")
+    return section
+
+def format_timestamp(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def clip_label(section):
+    return f"{format_timestamp(section[0])}-{format_timestamp(section[1])}"
+
+class ClipStats:
+    """Clips fetched, with their bytes and length next to those of the full videos"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clips = 0
+        self.clip_bytes = 0
+        self.full_bytes = 0
+        self.clip_seconds = 0.0
+        self.video_seconds = 0.0
+
+    def record(self, clip_bytes, full_bytes, clip_seconds, video_seconds):
+        with self._lock:
+            self.clips += 1
+            self.clip_bytes += clip_bytes
+            self.full_bytes += full_bytes
+            self.clip_seconds += clip_seconds
+            self.video_seconds += video_seconds
+
+    def summary(self):
+        with self._lock:
+            if not self.clips:
+                return []
+            return [{
+                'clips': self.clips,
+                'MB fetched': round(self.clip_bytes / 1024 ** 2, 1),
+                'MB for the full videos': round(self.full_bytes / 1024 ** 2, 1),
+                'share of video length': f"{self.clip_seconds / self.video_seconds:.0%}" if self.video_seconds else None,
+            }]
+
+@st.cache_resource
+def get_clip_stats():
+    return ClipStats()
+
+def expected_download_bytes(info_dict, section=None):
+    """Bytes yt-dlp will write for the selected formats, from the sizes YouTube reports (0 if unknown).
+
+    For a clip this is the full size scaled by the clip's share of the video.
+    """
+    formats = info_dict.get('requested_formats') or [info_dict]
+    total = sum(fmt.get('filesize') or fmt.get('filesize_approx') or 0 for fmt in formats)
+    duration = info_dict.get('duration')
+    if section and duration:
+        total = int(total * min((section[1] - section[0]) / duration, 1.0))
+    return total
+
+def fetch_video(video_id, variant, temp_file_manager, cookies_path=None, video_cache=None, url=None,
+                format_selector=VIDEO_FORMAT, progress_hooks=(), postprocessor_hooks=(), conversion_stats=None,
+                ext='mp4', metrics=None, section=None, clip_stats=None):
+    """Download a video into the shared cache and return its cache path; raises on failure.
+
+    url defaults to the YouTube watch page for video_id; any URL yt-dlp can
+    handle works, with video_id then serving as the cache identity. Files
+    are converted to browser-playable MP4 unless ext asks for another
+    container, as audio-only presets do.
+
+    With section, a (start, end) pair in seconds, only that part of the
+    video is fetched: yt-dlp hands ffmpeg the stream URLs to seek into and
+    stream-copies from the keyframe at or before start, so the clip may
+    begin slightly early but nothing is re-encoded. variant must then be
+    the clip's own cache variant.
+    """
+    video_cache = video_cache or get_video_cache()
+    # A concurrent download may have finished between the caller's lookup and now
+    if video_cache.contains(video_id, variant, ext):
+        return video_cache.entry_path(video_id, variant, ext)
+    metrics = metrics or get_metrics()
+    
+    # yt-dlp's own postprocessors (merging separate audio and video) are timed from their hooks
+    postprocessor_started = {}
+    def time_postprocessor(d):
+        if d['status'] == 'started':
+            postprocessor_started[d['postprocessor']] = time.perf_counter()
+        elif d['status'] == 'finished' and d['postprocessor'] in postprocessor_started:
+            seconds = time.perf_counter() - postprocessor_started.pop(d['postprocessor'])
+            metrics.observe('chuntube_postprocess_seconds', seconds, postprocessor=d['postprocessor'])
+    
+    stem = f'{video_id}.clip-{section[0]:g}-{section[1]:g}' if section else video_id
+    ydl_opts = {
+        'format': format_selector,
+        'outtmpl': os.path.join(temp_file_manager.temp_dir, f'{stem}.%(ext)s'),
+        'merge_output_format': 'mp4',
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'progress_hooks': list(progress_hooks),
+        'postprocessor_hooks': [*postprocessor_hooks, time_postprocessor],
+    }
+    
+    # Add cookies if path is provided
+    if cookies_path and os.path.exists(cookies_path):
+        ydl_opts['cookiefile'] = cookies_path
+    
+    if section:
+        ydl_opts['download_ranges'] = yt_dlp.utils.download_range_func(None, [section])
+        # Cutting exactly on start would mean re-encoding; copying from the previous keyframe doesn't
+        ydl_opts['force_keyframes_at_cuts'] = False
+    
+    with temp_file_manager.hold(video_id):
+        cpu_before = child_cpu_seconds()
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            # Resolve the formats first so the conversion can be chosen before downloading
+            with metrics.timer('chuntube_fetch_seconds', phase='resolve'):
+                info_dict = ydl.extract_info(url or f'https://www.youtube.com/watch?v={video_id}', download=False)
+            strategy = negotiate_conversion(info_dict)
+            # Merging separate streams or converting briefly needs a second copy
+            copies = 2 if info_dict.get('requested_formats') or (strategy != 'copy' and ext == 'mp4') else 1
+            temp_file_manager.reserve(video_id, expected_download_bytes(info_dict, section) * copies)
+            with metrics.timer('chuntube_fetch_seconds', phase='clip' if section else 'download'):
+                info_dict = ydl.process_ie_result(info_dict, download=True)
+            video_path = ydl.prepare_filename(info_dict)
+            
+            # Verify the downloaded file
+            if not os.path.exists(video_path):
+                raise Exception("Downloaded video file not found")
+            
+            file_size = os.path.getsize(video_path)
+            if file_size == 0:
+                raise Exception("Downloaded video file is empty")
+            metrics.inc('chuntube_download_bytes_total', file_size)
+            if section:
+                duration = info_dict.get('duration') or 0
+                clip_seconds = min(section[1], duration or section[1]) - section[0]
+                (clip_stats or get_clip_stats()).record(file_size, expected_download_bytes(info_dict), clip_seconds, duration)
+        
+        if ext != 'mp4':
+            # Audio is served in the container it was downloaded in
+            strategy = 'copy'
+        elif strategy is None:
+            try:
+                strategy = probe_conversion(video_path)
+            except (ffmpeg.Error, OSError) as e:
+                logger.warning(f"Could not probe {video_path}, serving it unconverted: {str(e)}")
+                strategy = 'copy'
+        if strategy != 'copy':
+            for hook in postprocessor_hooks:
+                hook({'status': 'started', 'postprocessor': strategy})
+            with metrics.timer('chuntube_fetch_seconds', phase=strategy):
+                video_path = convert_to_mp4(video_path, strategy)
+        
+        # Child CPU time is process-wide, so concurrent downloads blur the per-video figure
+        cpu_seconds = child_cpu_seconds() - cpu_before
+        (conversion_stats or get_conversion_stats()).record(strategy, cpu_seconds)
+        metrics.inc('chuntube_conversion_cpu_seconds_total', cpu_seconds, strategy=strategy)
+        logger.info(f"Successfully downloaded video {video_id} to {video_path} ({strategy}, {cpu_seconds:.2f} CPU s)")
+        return video_cache.commit(video_id, variant, video_path, ext)
+
+class DownloadJob:
+    """A download queued on the worker pool, with its state and byte progress.
+
+    State moves from queued to downloading and merging, and ends as done,
+    failed or cancelled.
+    """
+    def __init__(self, video_id, variant, temp_file_manager, cookies_path=None, url=None,
+                 format_selector=VIDEO_FORMAT, priority=0, throttle=None, ext='mp4', section=None):
+        self.job_id = secrets.token_hex(6)
+        self.video_id = video_id
+        self.variant = variant
+        self.url = url or f'https://www.youtube.com/watch?v={video_id}'
+        self.host = urlparse(self.url).hostname
+        self.temp_file_manager = temp_file_manager
+        self.cookies_path = cookies_path
+        self.format_selector = format_selector
+        self.ext = ext
+        # (start, end) seconds when only a clip is wanted
+        self.section = section
+        self.priority = priority
+        # Bytes per second; enforced from the progress hook so it can be lifted mid-download
+        self.throttle = throttle
+        self._throttled_bytes = 0
+        self.state = 'queued'
+        self.downloaded_bytes = 0
+        self.total_bytes = None
+        self.speed = None
+        self.video_path = None
+        self.error = None
+        # Number of callers waiting on this job; it is only cancelled once all of them give up
+        self.subscribers = 1
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self._file_progress = {}
+
+    @property
+    def is_active(self):
+        return self.state in ('queued', 'downloading', 'merging')
+
+    @property
+    def progress(self):
+        if self.state == 'done':
+            return 1.0
+        if not self.total_bytes:
+            return 0.0
+        return min(self.downloaded_bytes / self.total_bytes, 1.0)
+
+    def on_progress(self, d):
+        """yt-dlp progress hook; also the point where cancellation takes effect"""
+        if self.cancelled.is_set():
+            raise yt_dlp.utils.DownloadCancelled()
+        if d['status'] in ('downloading', 'finished'):
+            # Separate video and audio files are downloaded one after the other
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            self._file_progress[d.get('filename')] = (d.get('downloaded_bytes') or 0, total)
+            self.downloaded_bytes = sum(done for done, _ in self._file_progress.values())
+            totals = [total for _, total in self._file_progress.values()]
+            self.total_bytes = sum(totals) if all(totals) else None
+            self.speed = d.get('speed')
+        throttle = self.throttle
+        if throttle and d['status'] == 'downloading' and self.downloaded_bytes > self._throttled_bytes:
+            throttle.acquire(self.downloaded_bytes - self._throttled_bytes)
+            self._throttled_bytes = self.downloaded_bytes
+
+    def on_postprocess(self, d):
+        if d['status'] == 'started':
+            self.state = 'merging'
+
+    def finish(self, state, video_path=None, error=None):
+        self.state = state
+        self.video_path = video_path
+        self.error = error
+        self.finished_at = time.time()
+        self.done.set()
+
+class DownloadWorkerPool:
+    """Bounded pool of worker threads that run download jobs from a priority queue.
+
+    Lower priority values run first. At most per_host_limit jobs download from
+    the same host at once; jobs for a saturated host wait without blocking
+    jobs for other hosts. Background jobs (priority background_priority or
+    above) never take a host's last slot or the last free worker, so a user
+    request never waits behind them.
+    """
+    def __init__(self, workers=DOWNLOAD_WORKERS, per_host_limit=DOWNLOAD_HOST_LIMIT, video_cache=None, flights=None,
+                 background_priority=PREFETCH_PRIORITY):
+        self.per_host_limit = per_host_limit
+        self.background_priority = background_priority
+        self.video_cache = video_cache or get_video_cache()
+        self.flights = flights or get_download_flights()
+        self._cond = threading.Condition()
+        # Heap of (priority, sequence, job); the sequence keeps FIFO order within a priority
+        self._pending = []
+        self._sequence = itertools.count()
+        self._active_hosts = {}
+        self._running = set()
+        # (video_id, variant) -> live job, so repeated requests share one job
+        self._jobs = {}
+        self.stats = {'submitted': 0, 'deduplicated': 0, 'promoted': 0, 'done': 0, 'failed': 0, 'cancelled': 0}
+        self.workers = [
+            threading.Thread(target=self._work, name=f'download-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+        logger.info(f"Started {workers} download workers, {per_host_limit} per host")
+
+    def submit(self, video_id, temp_file_manager, cookies_path=None, url=None, format_selector=VIDEO_FORMAT,
+               priority=0, throttle=None, ext='mp4', section=None):
+        """Queue a download, or join the live job for the same video and variant"""
+        variant = self.video_cache.cache_variant(format_selector, cookies_path, section)
+        with self._cond:
+            job = self._jobs.get((video_id, variant))
+            if job and job.is_active:
+                job.subscribers += 1
+                self.stats['deduplicated'] += 1
+                if priority < job.priority:
+                    # A more urgent request joined a background prefetch: lift its
+                    # throttle and, if it hasn't started, requeue it at the new priority
+                    job.priority = priority
+                    job.throttle = throttle
+                    self.stats['promoted'] += 1
+                    if job.state == 'queued':
+                        heapq.heappush(self._pending, (priority, next(self._sequence), job))
+                        self._cond.notify()
+                return job
+            job = DownloadJob(
+                video_id, variant, temp_file_manager, cookies_path, url, format_selector, priority, throttle, ext,
+                section
+            )
+            self._jobs[(video_id, variant)] = job
+            heapq.heappush(self._pending, (priority, next(self._sequence), job))
+            self.stats['submitted'] += 1
+            self._cond.notify()
+        logger.info(f"Queued download job {job.job_id} for {video_id}")
+        return job
+
+    def cancel(self, job):
+        """Withdraw one subscriber from a job, cancelling it when nobody is left waiting"""
+        with self._cond:
+            job.subscribers -= 1
+            if job.subscribers > 0 or not job.is_active:
+                return
+            job.cancelled.set()
+            if job.state == 'queued':
+                self._finish(job, 'cancelled')
+        logger.info(f"Cancelled download job {job.job_id}")
+
+    def jobs(self):
+        with self._cond:
+            return list(self._jobs.values())
+
+    def _finish(self, job, state, video_path=None, error=None):
+        # Caller holds self._cond
+        if self._jobs.get((job.video_id, job.variant)) is job:
+            del self._jobs[(job.video_id, job.variant)]
+        self.stats[state] += 1
+        job.finish(state, video_path, error)
+
+    def _next_job(self):
+        """Pop the most urgent job whose host has a free slot, waiting until there is one"""
+        with self._cond:
+            while True:
+                for entry in sorted(self._pending):
+                    job = entry[2]
+                    # Drop entries for jobs that were cancelled or requeued at another priority
+                    if job.state != 'queued' or entry[0] != job.priority:
+                        self._pending.remove(entry)
+                        continue
+                    if self._has_slot(job):
+                        self._pending.remove(entry)
+                        heapq.heapify(self._pending)
+                        self._active_hosts[job.host] = self._active_hosts.get(job.host, 0) + 1
+                        self._running.add(job)
+                        job.state = 'downloading'
+                        return job
+                heapq.heapify(self._pending)
+                self._cond.wait()
+
+    def _has_slot(self, job):
+        # Caller holds self._cond
+        if self._active_hosts.get(job.host, 0) >= self.per_host_limit:
+            return False
+        if job.priority < self.background_priority:
+            return True
+        # A prefetch promoted by a user request while running counts as a user job from then on
+        background = [running for running in self._running if running.priority >= self.background_priority]
+        return (
+            sum(running.host == job.host for running in background) < self.per_host_limit - 1
+            and len(background) < len(self.workers) - 1
+        )
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    self._active_hosts[job.host] -= 1
+                    self._running.discard(job)
+                    self._cond.notify_all()
+
+    def _run(self, job):
+        job.started_at = time.time()
+        try:
+            video_path = self.flights.do(
+                (job.video_id, job.variant),
+                lambda: fetch_video(
+                    job.video_id, job.variant, job.temp_file_manager, job.cookies_path, self.video_cache,
+                    url=job.url,
+                    format_selector=job.format_selector,
+                    progress_hooks=[job.on_progress],
+                    postprocessor_hooks=[job.on_postprocess],
+                    ext=job.ext,
+                    section=job.section
+                )
+            )
+        except Exception as e:
+            with self._cond:
+                if job.cancelled.is_set():
+                    self._finish(job, 'cancelled')
+                else:
+                    logger.error(f"Download job {job.job_id} for {job.video_id} failed: {str(e)}")
+                    self._finish(job, 'failed', error=str(e))
+            return
+
+        with self._cond:
+            self._finish(job, 'done', video_path=video_path)
+        logger.info(f"Download job {job.job_id} for {job.video_id} done in {job.finished_at - job.started_at:.1f}s")
+
+@st.cache_resource
+def get_download_pool():
+    """One download worker pool per process, shared by every session"""
+    pool = DownloadWorkerPool()
+    get_metrics().register_collector('download_pool', stats_collector('chuntube_download_jobs_total', pool.stats, 'event'))
+    return pool
+
+class Prefetcher:
+    """Downloads the videos a session is likely to click next into the shared cache.
+
+    Each session (owner) has one set of prefetch jobs; updating it with the
+    videos now on screen cancels prefetches for the ones that are gone. A
+    finished prefetch is remembered until a user request claims it as a hit
+    or the cache evicts it.
+    """
+    def __init__(self, pool=None, video_cache=None, throttle=None):
+        self.pool = pool or get_download_pool()
+        self.video_cache = video_cache or get_video_cache()
+        # One bandwidth budget for every session's prefetches
+        self.throttle = throttle or TokenBucket(PREFETCH_RATE_LIMIT, PREFETCH_RATE_LIMIT)
+        self._lock = threading.Lock()
+        # owner -> {video_id: job}
+        self._jobs = {}
+        # (video_id, variant) -> cached path of finished, not yet watched prefetches
+        self._unclaimed = {}
+        self.stats = {
+            'started': 0, 'completed': 0, 'cancelled': 0, 'over_budget': 0, 'hits': 0, 'joined': 0, 'evicted': 0
+        }
+
+    def update(self, owner, videos, temp_file_manager, cookies_path=None, quality=DEFAULT_QUALITY):
+        """Prefetch the given videos for owner, cancelling its prefetches of any others"""
+        preset = QUALITY_PRESETS[quality]
+        variant = self.video_cache.cache_variant(preset['format'], cookies_path)
+        wanted = [
+            video['video_id'] for video in videos
+            if 0 < parse_duration_seconds(video.get('duration')) <= PREFETCH_MAX_SECONDS
+        ]
+        with self._lock:
+            self._reap()
+            jobs = self._jobs.pop(owner, {})
+            for video_id, job in jobs.items():
+                if video_id not in wanted:
+                    self.pool.cancel(job)
+                    self.stats['cancelled'] += 1
+            jobs = {video_id: job for video_id, job in jobs.items() if video_id in wanted}
+            for video_id in wanted:
+                if video_id in jobs or (video_id, variant) in self._unclaimed:
+                    continue
+                if self.video_cache.contains(video_id, variant, preset['ext']):
+                    continue
+                if self._unclaimed_bytes() >= self.video_cache.max_bytes * PREFETCH_DISK_FRACTION:
+                    self.stats['over_budget'] += 1
+                    continue
+                jobs[video_id] = self.pool.submit(
+                    video_id, temp_file_manager, cookies_path,
+                    format_selector=preset['format'], priority=PREFETCH_PRIORITY,
+                    throttle=self.throttle, ext=preset['ext']
+                )
+                self.stats['started'] += 1
+            if jobs:
+                self._jobs[owner] = jobs
+
+    def claim(self, video_id, variant):
+        """Count a user request served from the cache, crediting the prefetch that filled it"""
+        with self._lock:
+            self._reap()
+            if self._unclaimed.pop((video_id, variant), None):
+                self.stats['hits'] += 1
+                logger.info(f"Prefetch hit for {video_id}")
+
+    def summary(self):
+        with self._lock:
+            self._reap()
+            useful = self.stats['hits'] + self.stats['joined']
+            finished = self.stats['completed'] + self.stats['joined']
+            return {
+                **self.stats,
+                'hit_rate': round(useful / finished, 3) if finished else None,
+                'unclaimed_bytes': self._unclaimed_bytes(),
+                'throttled_seconds': round(self.throttle.stats['throttled_seconds'], 1),
+            }
+
+    def _reap(self):
+        # Caller holds self._lock. Move finished jobs out of the per-owner sets.
+        for owner, jobs in list(self._jobs.items()):
+            for video_id, job in list(jobs.items()):
+                if job.is_active:
+                    continue
+                del jobs[video_id]
+                if job.priority < PREFETCH_PRIORITY:
+                    # A user asked for it mid-prefetch and got it through the same job
+                    self.stats['joined'] += 1
+                elif job.state == 'done':
+                    self._unclaimed[(job.video_id, job.variant)] = job.video_path
+                    self.stats['completed'] += 1
+            if not jobs:
+                del self._jobs[owner]
+
+    def _unclaimed_bytes(self):
+        # Caller holds self._lock. Forget prefetches the cache has since evicted.
+        total = 0
+        for key, path in list(self._unclaimed.items()):
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                del self._unclaimed[key]
+                self.stats['evicted'] += 1
+        return total
+
+@st.cache_resource
+def get_prefetcher():
+    """One prefetcher per process, so the disk budget covers every session"""
+    prefetcher = Prefetcher()
+    get_metrics().register_collector('prefetch', stats_collector('chuntube_prefetch_events_total', prefetcher.stats, 'event'))
+    return prefetcher
+
+class ProgressiveStream:
+    """Fragmented-MP4 remux of a video that is still downloading.
+
+    on_complete, if given, is called with the output path once ffmpeg succeeds
+    and returns the path the finished file now lives at.
+    """
+    def __init__(self, video_id, output_path, process, on_complete=None):
+        self.video_id = video_id
+        self.output_path = output_path
+        self.process = process
+        self.on_complete = on_complete
+        self.started_at = time.time()
+        self.finished_at = None
+        self.error = None
+        self._done = threading.Event()
+        # communicate() drains ffmpeg's stderr so the pipe never fills up and stalls it
+        self.watcher = threading.Thread(target=self._wait_for_exit, daemon=True)
+        self.watcher.start()
+
+    def _wait_for_exit(self):
+        _, stderr = self.process.communicate()
+        self.finished_at = time.time()
+        if self.process.returncode != 0:
+            self.error = (stderr or b'').decode(errors='replace').strip()[-500:] or f"ffmpeg exited with {self.process.returncode}"
+            logger.error(f"Progressive remux of {self.video_id} failed: {self.error}")
+        else:
+            logger.info(f"Progressive remux of {self.video_id} finished in {self.finished_at - self.started_at:.1f}s")
+            if self.on_complete:
+                try:
+                    self.output_path = self.on_complete(self.output_path)
+                except Exception as e:
+                    logger.error(f"Error finishing progressive stream of {self.video_id}: {str(e)}")
+        self._done.set()
+
+    def is_growing(self):
+        return not self._done.is_set()
+
+    def wait_until_playable(self, timeout=PROGRESSIVE_START_TIMEOUT):
+        """Block until the first fragments are on disk; returns False if ffmpeg failed first"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self._done.is_set():
+                return self.error is None and os.path.exists(self.output_path)
+            if os.path.exists(self.output_path) and os.path.getsize(self.output_path) >= PROGRESSIVE_MIN_BYTES:
+                return True
+            time.sleep(0.1)
+        return False
+
+    def stop(self):
+        if self.is_growing():
+            self.process.terminate()
+        # Wait for the watcher so output_path is final when this returns
+        self.watcher.join(timeout=5)
+
+def start_progressive_stream(video_id, temp_file_manager, cookies_path=None, on_complete=None,
+                             format_selector=PROGRESSIVE_FORMAT):
+    """Resolve the stream URLs and start remuxing them into fragmented MP4 with ffmpeg"""
+    ydl_opts = {
+        'format': format_selector,
+        'quiet': True,
+        'no_warnings': True,
+    }
+    if cookies_path and os.path.exists(cookies_path):
+        ydl_opts['cookiefile'] = cookies_path
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info_dict = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
+
+    formats = info_dict.get('requested_formats') or [info_dict]
+    inputs = [
+        ffmpeg.input(
+            fmt['url'],
+            headers=''.join(f"{name}: {value}\r\n" for name, value in fmt.get('http_headers', {}).items())
+        )
+        for fmt in formats
+    ]
+    streams = [inputs[0]['v:0'], inputs[1]['a:0']] if len(inputs) == 2 else inputs
+
+    output_path = temp_file_manager.create_temp_file(f"{video_id}_progressive")
+    # empty_moov writes the header up front and frag_keyframe starts a new
+    # fragment at every keyframe, so the file is playable while it grows
+    process = (
+        ffmpeg
+        .output(*streams, output_path, c='copy', f='mp4', movflags='frag_keyframe+empty_moov+default_base_moof')
+        .global_args('-loglevel', 'error')
+        .overwrite_output()
+        .run_async(pipe_stderr=True)
+    )
+    logger.info(f"Started progressive remux of {video_id} to {output_path}")
+    return ProgressiveStream(video_id, output_path, process, on_complete)
+
+def open_progressive_stream(video_id, temp_file_manager, cookies_path=None, on_complete=None,
+                            format_selector=PROGRESSIVE_FORMAT):
+    """Start a progressive stream and wait for its first fragments; raises if it never becomes playable"""
+    stream = start_progressive_stream(video_id, temp_file_manager, cookies_path, on_complete, format_selector)
+    if not stream.wait_until_playable():
+        stream.stop()
+        raise Exception(stream.error or "Timed out waiting for the first video fragment")
+    return stream
+
+def stream_progressively(video_id, temp_file_manager, cookies_path=None, on_complete=None,
+                         format_selector=PROGRESSIVE_FORMAT):
+    """open_progressive_stream with a spinner, returning None when progressive playback isn't possible"""
+    try:
+        with st.spinner("Buffering video stream..."):
+            return open_progressive_stream(video_id, temp_file_manager, cookies_path, on_complete, format_selector)
+    except Exception as e:
+        logger.warning(f"Progressive playback unavailable for {video_id}, falling back to full download: {str(e)}")
+        return None
+
+class PlaybackStats:
+    """Time-to-first-frame samples per playback mode, split into short and long videos"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def record(self, mode, video_seconds, time_to_first_frame):
+        length = 'short' if video_seconds <= SHORT_VIDEO_SECONDS else 'long'
+        with self._lock:
+            self.samples.append((mode, length, time_to_first_frame))
+        logger.info(f"Time to first frame ({mode}, {length} video): {time_to_first_frame:.2f}s")
+
+    def summary(self):
+        with self._lock:
+            samples = list(self.samples)
+        groups = {}
+        for mode, length, seconds in samples:
+            groups.setdefault((mode, length), []).append(seconds)
+        return [
+            {
+                'mode': mode,
+                'video length': length,
+                'plays': len(values),
+                'median TTFF (s)': round(sorted(values)[len(values) // 2], 2),
+                'max TTFF (s)': round(max(values), 2),
+            }
+            for (mode, length), values in sorted(groups.items())
+        ]
+
+@st.cache_resource
+def get_playback_stats():
+    """Share playback timings across sessions so the two modes can be compared"""
+    return PlaybackStats()
+
+def format_duration(duration_str):
+    """Convert YouTube duration format to readable format"""
+    import re
+    match = re.match(r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?', duration_str)
+    if not match:
+        return "Unknown"
+    
+    hours, minutes, seconds = match.groups()
+    time_parts = []
+    
+    if hours:
+        time_parts.append(f"{int(hours)}h")
+    if minutes:
+        time_parts.append(f"{int(minutes)}m")
+    if seconds:
+        time_parts.append(f"{int(seconds)}s")
+    
+    return " ".join(time_parts)
+
+def parse_duration_seconds(duration_str):
+    """Convert YouTube duration format to a number of seconds"""
+    match = re.match(r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?', duration_str or '')
+    if not match:
+        return 0
+    hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+def format_number(number_str):
+    """Format large numbers with K/M/B suffixes"""
+    try:
+        number = int(number_str)
+        if number >= 1000000000:
+            return f"{number/1000000000:.1f}B"
+        elif number >= 1000000:
+            return f"{number/1000000:.1f}M"
+        elif number >= 1000:
+            return f"{number/1000:.1f}K"
+        return str(number)
+    except:
+        return "N/A"
+
+class ApiResponseCache:
+    """YouTube Data API responses shared across sessions and kept across restarts.
+
+    An in-memory LRU sits in front of a SQLite table. Responses are keyed by
+    endpoint and normalized parameters and stay fresh for a per-endpoint TTL;
+    after that a stale copy is still served for API_STALE_SECONDS while a
+    background refresh fetches a new one.
+    """
+    def __init__(self, db_path=API_CACHE_PATH, memory_entries=API_CACHE_MEMORY_ENTRIES):
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._refreshing = set()
+        self._writes = 0
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses '
+            '(key TEXT PRIMARY KEY, endpoint TEXT, body TEXT, fetched_at REAL)'
+        )
+        self._purge_expired()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'quota_units_saved': 0}
+        logger.info(f"Initialized ApiResponseCache at {db_path}")
+
+    @staticmethod
+    def cache_key(endpoint, params):
+        # Searches differing only in case or whitespace return the same results
+        normalized = {
+            name: ' '.join(str(value).lower().split()) if name == 'q' else value
+            for name, value in params.items()
+        }
+        return f"{endpoint}?{json.dumps(normalized, sort_keys=True)}"
+
+    @staticmethod
+    def ttl(endpoint, params):
+        """Statistics go stale fast; snippets and search results much more slowly"""
+        if 'statistics' in params.get('part', ''):
+            return API_STATISTICS_TTL
+        return API_CACHE_TTLS.get(endpoint, API_STATISTICS_TTL)
+
+    def get_or_fetch(self, endpoint, params, fetch):
+        """Return a cached response for endpoint/params, calling fetch() on a miss"""
+        key = self.cache_key(endpoint, params)
+        ttl = self.ttl(endpoint, params)
+        entry, level = self._read(key)
+        if entry:
+            body, fetched_at = entry
+            age = time.time() - fetched_at
+            if age < ttl + API_STALE_SECONDS:
+                with self._lock:
+                    self.stats['stale_hits' if age >= ttl else level] += 1
+                    self.stats['quota_units_saved'] += API_QUOTA_COSTS.get(endpoint, 1)
+                if age >= ttl:
+                    self._refresh_in_background(key, endpoint, fetch)
+                return body
+
+        with self._lock:
+            self.stats['misses'] += 1
+        body = fetch()
+        self._write(key, endpoint, body)
+        return body
+
+    def _read(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                self._memory.move_to_end(key)
+                return entry, 'memory_hits'
+            row = self.db.execute('SELECT body, fetched_at FROM responses WHERE key = ?', (key,)).fetchone()
+            if not row:
+                return None, None
+            entry = (json.loads(row[0]), row[1])
+            self._remember(key, entry)
+            return entry, 'disk_hits'
+
+    def _write(self, key, endpoint, body):
+        entry = (body, time.time())
+        with self._lock:
+            self._remember(key, entry)
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                (key, endpoint, json.dumps(body), entry[1])
+            )
+            self.db.commit()
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._purge_expired()
+
+    def _remember(self, key, entry):
+        # Caller holds self._lock
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _purge_expired(self):
+        oldest = time.time() - max(API_CACHE_TTLS.values()) - API_STALE_SECONDS
+        self.db.execute('DELETE FROM responses WHERE fetched_at < ?', (oldest,))
+        self.db.commit()
+
+    def _refresh_in_background(self, key, endpoint, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._write(key, endpoint, fetch())
+                with self._lock:
+                    self.stats['refreshes'] += 1
+            except Exception as e:
+                logger.error(f"Error refreshing cached {endpoint} response: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+@st.cache_resource
+def get_api_cache():
+    """One API response cache per process; the SQLite file is shared with other processes"""
+    cache = ApiResponseCache()
+    metrics = get_metrics()
+    metrics.register_collector('api_cache', stats_collector(
+        'chuntube_api_cache_lookups_total', cache.stats, 'result', ('memory_hits', 'disk_hits', 'stale_hits', 'misses')
+    ))
+    metrics.register_collector('api_cache_saved', lambda: [
+        ('chuntube_api_quota_units_saved_total', 'counter', {}, cache.stats['quota_units_saved'])
+    ])
+    return cache
+
+class MetadataIndex:
+    """Every video and channel record the app has fetched, searchable offline.
+
+    Records are stored as the JSON dicts the UI renders, next to an FTS5
+    table over their text. Where SQLite lacks FTS5, searches fall back to
+    LIKE matching on titles.
+    """
+    def __init__(self, db_path=METADATA_INDEX_PATH):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS videos '
+            '(video_id TEXT PRIMARY KEY, channel_id TEXT, record TEXT, indexed_at REAL)'
+        )
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS channels (channel_id TEXT PRIMARY KEY, record TEXT, indexed_at REAL)'
+        )
+        try:
+            self.db.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS video_fts USING fts5(video_id UNINDEXED, title, channel, description)'
+            )
+            self.db.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS channel_fts USING fts5(channel_id UNINDEXED, title, description)'
+            )
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite has no FTS5, local search will only match titles: {str(e)}")
+            self.fts = False
+        self.db.commit()
+        self.stats = {'searches': 0, 'last_search_ms': None}
+        logger.info(f"Initialized MetadataIndex at {db_path}")
+
+    @staticmethod
+    def match_expression(query):
+        # Every word has to match, as a prefix, somewhere in the indexed text
+        return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query.lower()))
+
+    def add_videos(self, videos):
+        now = time.time()
+        with self._lock:
+            for video in videos:
+                self.db.execute(
+                    'INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?)',
+                    (video['video_id'], video.get('channel_id'), json.dumps(video), now)
+                )
+                if self.fts:
+                    self.db.execute('DELETE FROM video_fts WHERE video_id = ?', (video['video_id'],))
+                    self.db.execute(
+                        'INSERT INTO video_fts VALUES (?, ?, ?, ?)',
+                        (video['video_id'], video['title'], video['channel'], video['description'])
+                    )
+            self.db.commit()
+
+    def add_channels(self, channels):
+        now = time.time()
+        with self._lock:
+            for channel in channels:
+                self.db.execute(
+                    'INSERT OR REPLACE INTO channels VALUES (?, ?, ?)',
+                    (channel['channel_id'], json.dumps(channel), now)
+                )
+                if self.fts:
+                    self.db.execute('DELETE FROM channel_fts WHERE channel_id = ?', (channel['channel_id'],))
+                    self.db.execute(
+                        'INSERT INTO channel_fts VALUES (?, ?, ?)',
+                        (channel['channel_id'], channel['title'], channel['description'])
+                    )
+            self.db.commit()
+
+    def search_videos(self, query, limit=LOCAL_SEARCH_RESULTS):
+        """Best matches for query, title matches weighing most"""
+        if self.fts:
+            sql = (
+                'SELECT v.record FROM video_fts JOIN videos v USING (video_id) '
+                'WHERE video_fts MATCH ? ORDER BY bm25(video_fts, 0, 10.0, 5.0, 1.0) LIMIT ?'
+            )
+        else:
+            sql = "SELECT record FROM videos WHERE json_extract(record, '$.title') LIKE ? ESCAPE '\\' LIMIT ?"
+        return self._search(sql, query, limit)
+
+    def search_channels(self, query, limit=2):
+        if self.fts:
+            sql = (
+                'SELECT c.record FROM channel_fts JOIN channels c USING (channel_id) '
+                'WHERE channel_fts MATCH ? ORDER BY bm25(channel_fts, 0, 10.0, 1.0) LIMIT ?'
+            )
+        else:
+            sql = "SELECT record FROM channels WHERE json_extract(record, '$.title') LIKE ? ESCAPE '\\' LIMIT ?"
+        return self._search(sql, query, limit)
+
+    def channel_videos(self, channel_id, limit=LOCAL_SEARCH_RESULTS):
+        """A channel's indexed videos, newest first"""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT record FROM videos WHERE channel_id = ? "
+                "ORDER BY json_extract(record, '$.published_at') DESC LIMIT ?",
+                (channel_id, limit)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    @staticmethod
+    def like_pattern(query):
+        """LIKE pattern matching query anywhere, with its own % and _ taken literally"""
+        escaped = re.sub(r'([\\%_])', r'\\\1', query.strip())
+        return f"%{escaped}%"
+
+    def _search(self, sql, query, limit):
+        pattern = self.match_expression(query) if self.fts else self.like_pattern(query)
+        if not pattern.strip('%'):
+            return []
+        started_at = time.perf_counter()
+        with self._lock:
+            rows = self.db.execute(sql, (pattern, limit)).fetchall()
+            self.stats['searches'] += 1
+            self.stats['last_search_ms'] = round((time.perf_counter() - started_at) * 1000, 2)
+        return [json.loads(row[0]) for row in rows]
+
+    def size(self):
+        with self._lock:
+            return {
+                'videos': self.db.execute('SELECT COUNT(*) FROM videos').fetchone()[0],
+                'channels': self.db.execute('SELECT COUNT(*) FROM channels').fetchone()[0],
+            }
+
+@st.cache_resource
+def get_metadata_index():
+    return MetadataIndex()
+
+def stats_are_stale(video):
+    return time.time() - video.get('stats_fetched_at', 0) > INDEX_STATISTICS_MAX_AGE
+
+def refresh_statistics(youtube, index, videos):
+    """Refetch stale views and likes in place, batching up to 50 videos per videos.list call"""
+    stale = [video for video in videos if stats_are_stale(video)]
+    if not stale:
+        return
+    try:
+        details_map = fetch_video_details(youtube, [video['video_id'] for video in stale])
+    except Exception as e:
+        # Keep showing the old numbers, marked with their age
+        logger.warning(f"Could not refresh statistics of {len(stale)} indexed videos: {str(e)}")
+        return
+    for video in stale:
+        statistics = details_map.get(video['video_id'], {}).get('statistics')
+        if statistics:
+            video['views'] = statistics.get('viewCount')
+            video['likes'] = statistics.get('likeCount')
+            video['stats_fetched_at'] = time.time()
+    index.add_videos(stale)
+
+class HttpConnectionPool:
+    """Keep-alive httplib2 connections, each handed to one thread at a time.
+
+    httplib2.Http isn't thread-safe, but reusing one across requests keeps its
+    TCP/TLS connection to the API alive. Idle connections are reused most
+    recently returned first, so the warmest ones are picked.
+    """
+    def __init__(self, max_idle=HTTP_POOL_SIZE):
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+        self._lock = threading.Lock()
+        self.stats = {'connections_created': 0, 'connections_reused': 0}
+
+    @contextmanager
+    def connection(self):
+        try:
+            http = self._idle.get_nowait()
+            stat = 'connections_reused'
+        except queue.Empty:
+            http = build_http()
+            stat = 'connections_created'
+        with self._lock:
+            self.stats[stat] += 1
+        try:
+            yield http
+        finally:
+            try:
+                self._idle.put_nowait(http)
+            except queue.Full:
+                pass
+
+@st.cache_resource
+def get_http_pool():
+    return HttpConnectionPool()
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+except Exception:
+    # No tz database; ignoring daylight saving shifts the reset by an hour in summer
+    QUOTA_TIMEZONE = timezone(timedelta(hours=-8))
+
+class QuotaExhausted(Exception):
+    """Every configured API key has used up today's quota"""
+
+def api_key_id(api_key):
+    """Name a key in stats and the ledger without revealing it"""
+    return f"…{api_key[-4:]}"
+
+def api_error_reason(error):
+    """The reason code of an API HttpError, e.g. 'quotaExceeded'"""
+    try:
+        return json.loads(error.content)['error']['errors'][0]['reason']
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+class QuotaLedger:
+    """Quota units spent per API key per quota day, kept next to the API cache.
+
+    Every process sharing the SQLite file charges the same rows, so the
+    estimate covers the whole host. Keys the API reported as exhausted stay
+    exhausted until the quota day rolls over.
+    """
+    def __init__(self, db_path=API_CACHE_PATH, daily_quota=API_DAILY_QUOTA):
+        self.daily_quota = daily_quota
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS quota_ledger '
+            '(key_hash TEXT, day TEXT, units INTEGER, exhausted INTEGER, PRIMARY KEY (key_hash, day))'
+        )
+
+    @staticmethod
+    def quota_day():
+        return datetime.now(QUOTA_TIMEZONE).strftime('%Y-%m-%d')
+
+    @staticmethod
+    def _key_hash(api_key):
+        return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+    def charge(self, api_key, units, exhausted=False):
+        with self._lock:
+            self.db.execute(
+                'INSERT INTO quota_ledger VALUES (?, ?, ?, ?) ON CONFLICT (key_hash, day) DO UPDATE SET '
+                'units = units + excluded.units, exhausted = MAX(exhausted, excluded.exhausted)',
+                (self._key_hash(api_key), self.quota_day(), units, int(exhausted))
+            )
+            self.db.commit()
+
+    def usage(self, api_key):
+        """(units spent today, whether the API said the key is exhausted)"""
+        with self._lock:
+            row = self.db.execute(
+                'SELECT units, exhausted FROM quota_ledger WHERE key_hash = ? AND day = ?',
+                (self._key_hash(api_key), self.quota_day())
+            ).fetchone()
+        return (row[0], bool(row[1])) if row else (0, False)
+
+    def remaining(self, api_key):
+        spent, exhausted = self.usage(api_key)
+        return 0 if exhausted else max(self.daily_quota - spent, 0)
+
+@st.cache_resource
+def get_quota_ledger():
+    return QuotaLedger()
+
+class TokenBucket:
+    """Blocking token-bucket rate limiter, in calls (or bytes) per second"""
+    def __init__(self, rate=API_RATE_PER_SECOND, burst=API_RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.stats = {'throttled': 0, 'throttled_seconds': 0.0}
+
+    def acquire(self, tokens=1):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            # Take the tokens now, going negative if need be, and sleep off the debt outside the lock
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+            if wait:
+                self.stats['throttled'] += 1
+                self.stats['throttled_seconds'] += wait
+        if wait:
+            time.sleep(wait)
+
+@st.cache_resource
+def get_rate_limiter():
+    """One rate limiter per process, shared by every key and session"""
+    return TokenBucket()
+
+@st.cache_resource
+def get_api_clients():
+    """Every live YouTubeClient, held weakly, with one collector reporting quota left for all their keys"""
+    clients = weakref.WeakSet()
+    def collect():
+        remaining = {}
+        for client in list(clients):
+            for row in client.quota_summary():
+                remaining[row['key']] = row['units_remaining']
+        return [('chuntube_api_quota_remaining', 'gauge', {'key': key}, units) for key, units in remaining.items()]
+    get_metrics().register_collector('api_quota', collect)
+    return clients
+
+class YouTubeClient:
+    """Thread-safe YouTube Data API access through the shared response cache and connection pool.
+
+    services maps each configured API key to a client built with it. Calls
+    use the first key with quota left, moving on to the next when the API
+    reports quotaExceeded, and every call is charged to the quota ledger.
+    """
+    def __init__(self, services, response_cache, http_pool, build_seconds=0.0, ledger=None, rate_limiter=None,
+                 metrics=None, registry=None):
+        self.services = services
+        self.response_cache = response_cache
+        self.http_pool = http_pool
+        self.ledger = ledger or get_quota_ledger()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.metrics = metrics or get_metrics()
+        # Reported by the registry's collector until the client is garbage collected
+        (registry if registry is not None else get_api_clients()).add(self)
+        self.retries = 0
+        self.key_rotations = 0
+        self.created_at = time.time()
+        self.build_seconds = build_seconds
+        self.first_result_at = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=200)
+
+    def list(self, resource, **params):
+        """Call <resource>.list with params, e.g. list('search', q='cats', part='snippet')"""
+        response = self.response_cache.get_or_fetch(
+            f"{resource}.list", params, lambda: self._execute(resource, params)
+        )
+        if self.first_result_at is None:
+            self.first_result_at = time.time()
+        return response
+
+    def _execute(self, resource, params):
+        cost = API_QUOTA_COSTS.get(f"{resource}.list", 1)
+        for api_key, service in self.services.items():
+            if self.ledger.remaining(api_key) < cost:
+                continue
+            try:
+                return self._execute_with_retries(api_key, service, resource, params, cost)
+            except HttpError as e:
+                if api_error_reason(e) not in ('quotaExceeded', 'dailyLimitExceeded'):
+                    raise
+                self.ledger.charge(api_key, 0, exhausted=True)
+                with self._lock:
+                    self.key_rotations += 1
+                logger.warning(f"API key {api_key_id(api_key)} is out of quota, trying the next key")
+        raise QuotaExhausted("All YouTube API keys are out of quota until midnight Pacific time")
+
+    def _execute_with_retries(self, api_key, service, resource, params, cost):
+        for attempt in range(API_MAX_RETRIES + 1):
+            self.rate_limiter.acquire()
+            request = getattr(service, resource)().list(**params)
+            started_at = time.perf_counter()
+            try:
+                with self.metrics.timer('chuntube_api_request_seconds', endpoint=f"{resource}.list"), \
+                        self.http_pool.connection() as http:
+                    response = request.execute(http=http)
+            except HttpError as e:
+                status = e.resp.status
+                self.metrics.inc('chuntube_api_errors_total', endpoint=f"{resource}.list", status=status)
+                # The API bills failed calls too, except when refusing one for lack of quota
+                if api_error_reason(e) not in ('quotaExceeded', 'dailyLimitExceeded'):
+                    self.ledger.charge(api_key, cost)
+                    self.metrics.inc('chuntube_api_quota_units_total', cost, endpoint=f"{resource}.list")
+                if attempt == API_MAX_RETRIES or not (status == 429 or status >= 500):
+                    raise
+                retry_after = e.resp.get('retry-after', '')
+                delay = float(retry_after) if retry_after.isdigit() else random.uniform(
+                    0, min(API_BACKOFF_MAX, API_BACKOFF_BASE * 2 ** attempt)
+                )
+                with self._lock:
+                    self.retries += 1
+                logger.warning(f"{resource}.list failed with {status}, retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            self.ledger.charge(api_key, cost)
+            self.metrics.inc('chuntube_api_quota_units_total', cost, endpoint=f"{resource}.list")
+            with self._lock:
+                self._latencies.append(time.perf_counter() - started_at)
+            return response
+
+    def quota_exhausted(self):
+        """True when no key has enough quota left for a search"""
+        return all(self.ledger.remaining(api_key) < API_QUOTA_COSTS['search.list'] for api_key in self.services)
+
+    def quota_summary(self):
+        """Quota spent and left today per key, for the stats panel"""
+        rows = []
+        for api_key in self.services:
+            spent, exhausted = self.ledger.usage(api_key)
+            rows.append({
+                'key': api_key_id(api_key),
+                'units_spent': spent,
+                'units_remaining': self.ledger.remaining(api_key),
+                'exhausted': exhausted,
+            })
+        return rows
 
-def download_and_stream_video(video_id, temp_file_manager, cookies_path=None):
-    """Enhanced video download function with cookie support"""
-    try:
-        ydl_opts = {
-            'format': 'bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]',
-            'outtmpl': os.path.join(temp_file_manager.temp_dir, f'{video_id}.%(ext)s'),
-            'merge_output_format': 'mp4',
-            'quiet': True,
-            'no_warnings': True,
-            'postprocessors': [{
-                'key': 'FFmpegVideoConvertor',
-                'preferedformat': 'mp4',
-            }],
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        return {
+            'build_seconds': round(self.build_seconds, 3),
+            'startup_to_first_result_seconds': round(self.first_result_at - self.created_at + self.build_seconds, 3)
+                if self.first_result_at else None,
+            'requests': len(latencies),
+            'median_request_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            'retries': self.retries,
+            'key_rotations': self.key_rotations,
+            **self.rate_limiter.stats,
+            **self.http_pool.stats,
         }
+
+class ThumbnailCache:
+    """Fetches each thumbnail URL once and keeps a downsized WebP copy on disk.
+
+    The copies are served by the media server, so reruns don't refetch them
+    from YouTube. Without Pillow the original image is cached unchanged.
+    Lookups (hits and misses) are counted per render of a result page. Like
+    the video cache, the directory is kept under max_bytes by evicting the
+    least recently used copies; on_evict is called with each evicted path.
+    """
+    def __init__(self, cache_dir=THUMBNAIL_DIR, width=THUMBNAIL_WIDTH, max_bytes=THUMBNAIL_MAX_BYTES, on_evict=None):
+        self.cache_dir = cache_dir
+        self.width = width
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # Concurrent requests for the same URL share one fetch
+        self._flights = SingleFlight()
+        self.stats = {
+            'hits': 0, 'misses': 0, 'errors': 0, 'bytes_fetched': 0, 'bytes_stored': 0,
+            'evictions': 0, 'evicted_bytes': 0,
+        }
+
+    def path_for(self, url):
+        ext = 'webp' if Image else os.path.splitext(urlparse(url).path)[1].lstrip('.') or 'jpg'
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(url.encode()).hexdigest()}.{ext}")
+
+    def get(self, url):
+        """Return the local path of the cached thumbnail, or None if it couldn't be fetched"""
+        path = self.path_for(url)
+        try:
+            # Bump the mtime: it is the LRU clock, as in the video cache
+            os.utime(path)
+            hit = True
+        except OSError:
+            hit = False
+        if not hit:
+            try:
+                self._flights.do(url, lambda: self._fetch(url, path))
+            except Exception as e:
+                logger.error(f"Error caching thumbnail {url}: {str(e)}")
+                with self._lock:
+                    self.stats['errors'] += 1
+                return None
+        with self._lock:
+            self.stats['hits' if hit else 'misses'] += 1
+        return path
+
+    def cached_path(self, url):
+        """Local path of a thumbnail already on disk, or None; not counted as a lookup"""
+        path = self.path_for(url)
+        return path if os.path.exists(path) else None
+
+    def prefetch(self, urls, executor):
+        """Cache a page worth of thumbnails in parallel, then evict down to the budget if any were new"""
+        misses = self.stats['misses']
+        list(executor.map(self.get, set(urls)))
+        if self.stats['misses'] != misses:
+            self.evict_to_budget()
+
+    def evict_to_budget(self):
+        """Evict least recently used thumbnails until the directory fits max_bytes"""
+        with self._lock:
+            entries = []
+            for file_path in glob.glob(os.path.join(self.cache_dir, '*.*')):
+                if file_path.endswith('.tmp'):
+                    continue
+                try:
+                    file_stat = os.stat(file_path)
+                except OSError:
+                    continue
+                entries.append((file_stat.st_mtime, file_stat.st_size, file_path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, file_path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(file_path)
+                except OSError as e:
+                    logger.error(f"Error evicting thumbnail {file_path}: {str(e)}")
+                    continue
+                total -= size
+                self.stats['evictions'] += 1
+                self.stats['evicted_bytes'] += size
+                if self.on_evict:
+                    self.on_evict(file_path)
+
+    def _fetch(self, url, path):
+        if os.path.exists(path):
+            return
+        with urllib.request.urlopen(url, timeout=THUMBNAIL_FETCH_TIMEOUT) as response:
+            data = response.read()
         
-        # Add cookies if path is provided
-        if cookies_path and os.path.exists(cookies_path):
-            ydl_opts['cookiefile'] = cookies_path
+        if Image:
+            image = Image.open(io.BytesIO(data))
+            # Only ever shrink, and only by width; the CSS caps thumbnails at this width anyway
+            image.thumbnail((self.width, image.height))
+            output = io.BytesIO()
+            image.save(output, 'WEBP', quality=80)
+            data_to_store = output.getvalue()
+        else:
+            data_to_store = data
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            with st.spinner("Preparing video stream..."):
-                info_dict = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=True)
-                video_path = ydl.prepare_filename(info_dict)
-                
-                # Verify the downloaded file
-                if not os.path.exists(video_path):
-                    raise Exception("Downloaded video file not found")
-                
-                file_size = os.path.getsize(video_path)
-                if file_size == 0:
-                    raise Exception("Downloaded video file is empty")
-                
-                logger.info(f"Successfully downloaded video {video_id} to {video_path}")
-                return video_path
-            
-    except Exception as e:
-        logger.error(f"Error downloading video {video_id}: {str(e)}")
-        st.error(f"Error downloading video: {str(e)}")
-        return None
+        staging = f"{path}.{threading.get_ident()}.tmp"
+        with open(staging, 'wb') as f:
+            f.write(data_to_store)
+        os.replace(staging, path)
+        with self._lock:
+            self.stats['bytes_fetched'] += len(data)
+            self.stats['bytes_stored'] += len(data_to_store)
 
-def format_duration(duration_str):
-    """Convert YouTube duration format to readable format"""
-    import re
-    match = re.match(r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?', duration_str)
-    if not match:
-        return "Unknown"
-    
-    hours, minutes, seconds = match.groups()
-    time_parts = []
-    
-    if hours:
-        time_parts.append(f"{int(hours)}h")
-    if minutes:
-        time_parts.append(f"{int(minutes)}m")
-    if seconds:
-        time_parts.append(f"{int(seconds)}s")
-    
-    return " ".join(time_parts)
+@st.cache_resource
+def get_thumbnail_cache():
+    # Evicted thumbnails stop being served, so the media server's token maps stay bounded too
+    cache = ThumbnailCache(on_evict=lambda path: get_media_server().revoke(path))
+    metrics = get_metrics()
+    metrics.register_collector('thumbnails', stats_collector(
+        'chuntube_thumbnail_lookups_total', cache.stats, 'result', ('hits', 'misses', 'errors')
+    ))
+    metrics.register_collector('thumbnail_evictions', lambda: [
+        ('chuntube_thumbnail_evictions_total', 'counter', {}, cache.stats['evictions']),
+        ('chuntube_thumbnail_evicted_bytes_total', 'counter', {}, cache.stats['evicted_bytes']),
+    ])
+    return cache
 
-def format_number(number_str):
-    """Format large numbers with K/M/B suffixes"""
-    try:
-        number = int(number_str)
-        if number >= 1000000000:
-            return f"{number/1000000000:.1f}B"
-        elif number >= 1000000:
-            return f"{number/1000000:.1f}M"
-        elif number >= 1000:
-            return f"{number/1000:.1f}K"
-        return str(number)
-    except:
-        return "N/A"
+def local_thumbnail(url, base_url=None):
+    """URL of the locally cached, resized copy of a thumbnail on the media server at base_url.
+
+    The original URL is kept if the thumbnail isn't cached (it is fetched
+    by ThumbnailCache.prefetch before rendering) or there is no base_url,
+    i.e. the browser can't reach the media server.
+    """
+    path = get_thumbnail_cache().cached_path(url) if base_url else None
+    return get_media_server().publish(path, base_url=base_url, kind='thumbnail') if path else url
+
+def best_thumbnail(thumbnails):
+    """The smallest thumbnail that is still at least THUMBNAIL_WIDTH wide"""
+    for size in ('medium', 'high', 'default'):
+        if size in thumbnails:
+            return thumbnails[size]['url']
 
 # Enhanced search functions with data caching
-def search_videos_with_details(youtube, query, max_results=4):
-    """Search for videos and fetch their details in a single function to minimize API calls"""
-    cache_key = f"search_videos_{query}_{max_results}"
-    
-    # Check if results are in session state cache
-    if cache_key in st.session_state:
-        return st.session_state[cache_key]
-    
-    try:
-        # Get video search results with all needed parts in one request
-        request = youtube.search().list(
-            q=query,
-            part='snippet',
-            type='video',
-            maxResults=max_results
+def fetch_video_details(youtube, video_ids):
+    """Fetch details for any number of videos, batching ids up to the API's per-call limit"""
+    details_map = {}
+    for start in range(0, len(video_ids), VIDEOS_LIST_MAX_IDS):
+        details_response = youtube.list(
+            'videos',
+            part='snippet,statistics,contentDetails',
+            id=','.join(video_ids[start:start + VIDEOS_LIST_MAX_IDS])
         )
-        search_response = request.execute()
-        
-        # Extract video IDs for bulk details fetch
-        video_ids = [item['id']['videoId'] for item in search_response['items']]
-        
-        # Fetch details for all videos in one batch request
-        if video_ids:
-            details_request = youtube.videos().list(
-                part='snippet,statistics,contentDetails',
-                id=','.join(video_ids)
-            )
-            details_response = details_request.execute()
-            details_map = {item['id']: item for item in details_response['items']}
-        
-        # Combine search results with details
-        videos = []
-        for item in search_response['items']:
-            video_id = item['id']['videoId']
-            details = details_map.get(video_id, {})
-            
-            video_data = {
-                'title': item['snippet']['title'],
-                'video_id': video_id,
-                'thumbnail': item['snippet']['thumbnails']['default']['url'],
-                'channel': item['snippet']['channelTitle'],
-                'channel_id': item['snippet']['channelId'],
-                'published_at': datetime.strptime(
-                    item['snippet']['publishedAt'], 
-                    '%Y-%m-%dT%H:%M:%SZ'
-                ).strftime('%Y-%m-%d'),
-                'description': item['snippet']['description'],
-                'duration': details.get('contentDetails', {}).get('duration'),
-                'views': details.get('statistics', {}).get('viewCount'),
-                'likes': details.get('statistics', {}).get('likeCount')
-            }
-            videos.append(video_data)
-        
-        # Cache the results in session state
-        st.session_state[cache_key] = videos
-        return videos
-        
-    except Exception as e:
-        logger.error(f"Error in search_videos_with_details: {str(e)}")
-        return []
+        details_map.update({item['id']: item for item in details_response['items']})
+    return details_map
 
-def get_channel_videos_with_details(youtube, channel_id, max_results=2):
-    """Fetch channel videos with details in a single function to minimize API calls"""
-    cache_key = f"channel_videos_{channel_id}_{max_results}"
+def fetch_video_page(youtube, search_params, page_token=None, index=None):
+    """Fetch one page of video search results with their details.
+
+    Returns a dict with the page's 'videos' and the 'next_page_token' to
+    continue from, which is None on the last page. The videos are also
+    added to index, if given.
+    """
+    if page_token:
+        search_params = {**search_params, 'pageToken': page_token}
+    # Get video search results with all needed parts in one request
+    search_response = youtube.list('search', part='snippet', type='video', **search_params)
     
-    # Check cache first
-    if cache_key in st.session_state:
-        return st.session_state[cache_key]
+    # Fetch details for all videos in as few batch requests as possible
+    video_ids = [item['id']['videoId'] for item in search_response['items']]
+    details_map = fetch_video_details(youtube, video_ids)
     
-    try:
-        # Get channel videos with all needed parts in one request
-        request = youtube.search().list(
-            part='snippet',
-            channelId=channel_id,
-            type='video',
-            maxResults=max_results,
-            order='date'
-        )
-        search_response = request.execute()
-        
-        # Extract video IDs for bulk details fetch
-        video_ids = [item['id']['videoId'] for item in search_response['items']]
-        
-        # Fetch details for all videos in one batch request
-        if video_ids:
-            details_request = youtube.videos().list(
-                part='snippet,statistics,contentDetails',
-                id=','.join(video_ids)
-            )
-            details_response = details_request.execute()
-            details_map = {item['id']: item for item in details_response['items']}
-        
-        # Combine search results with details
-        videos = []
-        for item in search_response['items']:
-            video_id = item['id']['videoId']
-            details = details_map.get(video_id, {})
-            
-            video_data = {
-                'title': item['snippet']['title'],
-                'video_id': video_id,
-                'thumbnail': item['snippet']['thumbnails']['default']['url'],
-                'channel': item['snippet']['channelTitle'],
-                'channel_id': item['snippet']['channelId'],
-                'published_at': datetime.strptime(
-                    item['snippet']['publishedAt'], 
-                    '%Y-%m-%dT%H:%M:%SZ'
-                ).strftime('%Y-%m-%d'),
-                'description': item['snippet']['description'],
-                'duration': details.get('contentDetails', {}).get('duration'),
-                'views': details.get('statistics', {}).get('viewCount'),
-                'likes': details.get('statistics', {}).get('likeCount')
-            }
-            videos.append(video_data)
-        
-        # Cache the results
-        st.session_state[cache_key] = videos
-        return videos
+    # Combine search results with details
+    videos = []
+    for item in search_response['items']:
+        video_id = item['id']['videoId']
+        details = details_map.get(video_id, {})
         
-    except Exception as e:
-        logger.error(f"Error in get_channel_videos_with_details: {str(e)}")
-        return []
+        video_data = {
+            'title': item['snippet']['title'],
+            'video_id': video_id,
+            'thumbnail': best_thumbnail(item['snippet']['thumbnails']),
+            'channel': item['snippet']['channelTitle'],
+            'channel_id': item['snippet']['channelId'],
+            'published_at': datetime.strptime(
+                item['snippet']['publishedAt'], 
+                '%Y-%m-%dT%H:%M:%SZ'
+            ).strftime('%Y-%m-%d'),
+            'description': item['snippet']['description'],
+            'duration': details.get('contentDetails', {}).get('duration'),
+            'views': details.get('statistics', {}).get('viewCount'),
+            'likes': details.get('statistics', {}).get('likeCount'),
+            'stats_fetched_at': time.time()
+        }
+        videos.append(video_data)
+    
+    if index:
+        index.add_videos(videos)
+    return {'videos': videos, 'next_page_token': search_response.get('nextPageToken')}
+
+class ResultPager:
+    """Video results fetched a page at a time as the user asks for more.
+
+    Pages are kept in order once fetched, and each API call is cached by its
+    page token in the shared response cache.
+    """
+    def __init__(self, youtube, search_params, page_size, index=None):
+        self.youtube = youtube
+        self.index = index
+        self.search_params = {**search_params, 'maxResults': page_size}
+        self.pages = []
+        self.next_page_token = None
+        # Why the last page failed to load, until a page loads again
+        self.error = None
+
+    @property
+    def has_more(self):
+        return not self.pages or self.next_page_token is not None
+
+    def first_page(self):
+        if not self.pages:
+            self.load_more()
+        return self.pages[0] if self.pages else []
+
+    def load_more(self):
+        """Fetch the next page and return its videos; errors are kept in error and leave the pages unchanged"""
+        if not self.has_more:
+            return []
+        try:
+            page = fetch_video_page(self.youtube, self.search_params, self.next_page_token, self.index)
+        except Exception as e:
+            logger.error(f"Error loading results page for {self.search_params}: {str(e)}")
+            self.error = str(e)
+            return []
+        self.error = None
+        self.pages.append(page['videos'])
+        self.next_page_token = page['next_page_token']
+        return page['videos']
+
+def card_html(video, base_url=None):
+    """A result card's thumbnail and details as one HTML block"""
+    duration = format_duration(video.get('duration', 'PT0S'))
+    views = format_number(video.get('views', '0'))
+    likes = format_number(video.get('likes', '0'))
+    # Numbers from the local index that couldn't be refreshed say how old they are
+    as_of = ''
+    if video.get('stats_fetched_at') and stats_are_stale(video):
+        as_of = f" (as of {datetime.fromtimestamp(video['stats_fetched_at']):%Y-%m-%d})"
+    return ''.join([
+        f'<div class="thumbnail-container"><img src="{html.escape(local_thumbnail(video["thumbnail"], base_url))}"></div>',
+        f'<div class="video-title">{html.escape(video["title"])}</div>',
+        f'<div class="video-info">Channel: {html.escape(video["channel"])}</div>',
+        f'<div class="video-info">Published: {html.escape(video["published_at"])}</div>',
+        f'<div class="video-info">Duration: {duration}</div>',
+        f'<div class="video-info">Views: {views} • Likes: {likes}{as_of}</div>',
+    ])
+
+def channel_html(channel, base_url=None):
+    return ''.join([
+        f'<div class="channel-thumbnail-container"><img src="{html.escape(local_thumbnail(channel["thumbnail"], base_url))}"></div>',
+        f'<div class="video-title">{html.escape(channel["title"])}</div>',
+        f'<div class="video-info">{html.escape(channel["description"])}</div>',
+    ])
+
+class RenderCache:
+    """Rendered card HTML per result page, keyed by a hash of the page's results.
+
+    Reruns redraw the same pages over and over; this way each card costs one
+    markdown element instead of formatting and a dozen elements every time.
+    Pages are rendered separately for each media server base URL, since
+    thumbnails point at it (or at YouTube when it's None).
+    """
+    def __init__(self, max_pages=RENDER_CACHE_PAGES):
+        self.max_pages = max_pages
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0}
 
-def display_video_card(video, idx, video_type, temp_file_manager, cookies_path=None):
-    """Display a video card using pre-fetched details"""
+    @staticmethod
+    def page_key(videos):
+        return hashlib.sha256(json.dumps(videos, sort_keys=True, default=str).encode()).hexdigest()
+
+    def cards(self, videos, base_url=None):
+        key = (base_url, self.page_key(videos))
+        with self._lock:
+            cards = self._pages.get(key)
+            if cards is not None:
+                self._pages.move_to_end(key)
+                self.stats['hits'] += 1
+                return cards
+        # Fetching the page's thumbnails happens outside the lock
+        if base_url:
+            get_thumbnail_cache().prefetch([video['thumbnail'] for video in videos], get_search_executor())
+        cards = [card_html(video, base_url) for video in videos]
+        with self._lock:
+            self._pages[key] = cards
+            self.stats['misses'] += 1
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return cards
+
+@st.cache_resource
+def get_render_cache():
+    """Card HTML shared by every session, since they see many of the same results"""
+    cache = RenderCache()
+    get_metrics().register_collector('render_cache', stats_collector('chuntube_render_cache_total', cache.stats, 'event'))
+    return cache
+
+def display_video_card(video, card, idx, video_type, temp_file_manager, cookies_path=None, rerun_scope='fragment'):
+    """Display a video card from its pre-rendered HTML, with Stream and Download buttons"""
     with st.container():
-        st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
-        
-        # Thumbnail with controlled size
-        st.markdown(f'<div class="thumbnail-container">', unsafe_allow_html=True)
-        st.image(video['thumbnail'], use_container_width=False)
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        # Video information with proper styling
-        st.markdown(f'<div class="video-title">{video["title"]}</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="video-info">Channel: {video["channel"]}</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="video-info">Published: {video["published_at"]}</div>', unsafe_allow_html=True)
-        
-        # Use pre-fetched details
-        duration = format_duration(video.get('duration', 'PT0S'))
-        views = format_number(video.get('views', '0'))
-        likes = format_number(video.get('likes', '0'))
-        
-        st.markdown(f'<div class="video-info">Duration: {duration}</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="video-info">Views: {views} • Likes: {likes}</div>', unsafe_allow_html=True)
+        st.markdown(card, unsafe_allow_html=True)
         
         col1, col2 = st.columns(2)
         with col1:
             if st.button(f"▶ Stream", key=f"stream_{video_type}_{idx}_{video['video_id']}"):
-                handle_video_stream(video, temp_file_manager, cookies_path)
+                handle_video_stream(video, temp_file_manager, cookies_path, rerun_scope)
         
         with col2:
             if st.button(f"⬇ Download", key=f"download_{video_type}_{idx}_{video['video_id']}"):
                 handle_video_download(video, temp_file_manager, cookies_path)
 
-def handle_video_stream(video, temp_file_manager, cookies_path=None):
-    """Handle video streaming with proper error handling and video playback"""
+def show_video_preview(videos):
+    """Read-only cards for results shown while the live ones load"""
+    cols = st.columns(2)
+    for offset, card in enumerate(get_render_cache().cards(videos, media_base_url())):
+        with cols[offset % 2]:
+            st.markdown(card, unsafe_allow_html=True)
+
+def show_video_grid(videos, start_idx, video_type, temp_file_manager, cookies_path=None, rerun_scope='fragment'):
+    """Display videos as cards in a two-column grid"""
+    cols = st.columns(2)
+    for offset, (video, card) in enumerate(zip(videos, get_render_cache().cards(videos, media_base_url()))):
+        with cols[offset % 2]:
+            display_video_card(
+                video, card, start_idx + offset, video_type, temp_file_manager, cookies_path, rerun_scope
+            )
+
+def get_pager(key, youtube, search_params, page_size):
+    """This session's pager for a result set, created on first use"""
+    if key not in st.session_state.pagers:
+        st.session_state.pagers[key] = ResultPager(youtube, search_params, page_size, get_metadata_index())
+    return st.session_state.pagers[key]
+
+@st.fragment
+def show_more_results(pager, video_type, temp_file_manager, cookies_path=None, number=1):
+    """Render the pages from page `number` on (counting the first as 0) and a "Load more" button.
+
+    Every page is a fragment nested in the one before it, and the button sits
+    in the fragment of the first page not loaded yet, so loading a page
+    sends only that page's cards instead of rerunning every card above it.
+    The player isn't in these fragments, so Stream on their cards reruns the app.
+    """
+    if number < len(pager.pages):
+        start_idx = sum(len(page) for page in pager.pages[:number])
+        show_video_grid(pager.pages[number], start_idx, video_type, temp_file_manager, cookies_path, 'app')
+        show_more_results(pager, video_type, temp_file_manager, cookies_path, number + 1)
+        return
+    
+    if pager.error and pager.pages:
+        st.warning(f"Couldn't load more results: {pager.error}")
+    if pager.has_more:
+        st.button("Load more", key=f"load_more_{video_type}", on_click=pager.load_more)
+
+def pick_quality(throughput):
+    """Best video preset a client pulling throughput bits per second can sustain"""
+    if not throughput:
+        return DEFAULT_QUALITY
+    fitting = [
+        name for name, preset in QUALITY_PRESETS.items()
+        if not preset['audio_only'] and preset['bitrate'] * QUALITY_HEADROOM <= throughput
+    ]
+    return fitting[-1] if fitting else next(iter(QUALITY_PRESETS))
+
+def media_base_url():
+    """Base URL this session's browser reaches the media server at, or None when it can't reach it"""
+    try:
+        return get_media_server().url_for_browser(getattr(st.context, 'url', None), st.context.headers)
+    except RuntimeError:
+        # Headless runs (AppTest, benchmarks) fetch from this machine
+        return get_media_server().public_url
+
+def show_media_unreachable():
+    # Handing Streamlit the file instead would load all of it into memory
+    st.error(
+        "This browser can't reach the media server, so videos can't be played or downloaded. "
+        "Open the app over plain HTTP on the machine it runs on, set CHUNTUBE_MEDIA_HOST so other "
+        "devices can reach the server, or set CHUNTUBE_MEDIA_URL to where a proxy exposes it."
+    )
+
+def media_url(file_path, is_growing=None, download_name=None):
+    """URL of file_path on the media server for this session's browser, or None if it can't reach it"""
+    base_url = media_base_url()
+    if base_url is None:
+        return None
+    return get_media_server().publish(file_path, is_growing, download_name, base_url)
+
+def client_throughput():
+    try:
+        client = st.context.ip_address
+    except RuntimeError:
+        # Headless runs (AppTest, benchmarks) have no browser connection
+        client = None
+    return get_media_server().throughput(client)
+
+def selected_quality():
+    """This session's quality preset, with Auto resolved from the measured throughput"""
+    quality = st.session_state.get('quality', 'Auto')
+    if quality == 'Auto':
+        return pick_quality(client_throughput())
+    return quality
+
+def selected_clip():
+    """This session's clip as (start, end) seconds, or None for whole videos (and for unreadable input)"""
+    try:
+        return parse_clip(st.session_state.get('clip', ''))
+    except ValueError:
+        return None
+
+def clip_video(video, section):
+    """video, titled and keyed as the given clip of it"""
+    if not section:
+        return video
+    label = clip_label(section)
+    return {**video, 'title': f"{video['title']} [{label}]", 'clip': label}
+
+def handle_video_stream(video, temp_file_manager, cookies_path=None, rerun_scope='fragment'):
+    """Start playback from the cache or a progressive stream, or queue a background download.
+
+    Playback is rendered by show_player in the show_results fragment, so
+    once it is set up only that fragment reruns. Cards in the pages Load
+    more adds sit in fragments nested inside it and pass rerun_scope='app'.
+    """
+    if not media_base_url():
+        show_media_unreachable()
+        return
     try:
-        if st.session_state.current_video:
-            st.session_state.previous_video = st.session_state.current_video
+        started_at = time.time()
+        video_id = video['video_id']
+        media_server = get_media_server()
+        video_cache = get_video_cache()
+        lease = st.session_state.cache_lease
+        quality = selected_quality()
+        preset = QUALITY_PRESETS[quality]
+        section = selected_clip()
+        video = clip_video(video, section)
         
-        video_path = download_and_stream_video(video['video_id'], temp_file_manager, cookies_path)
-        if video_path:
-            st.session_state.current_video = video_path
+        # Clips are short, and cut by yt-dlp once their ranges are fetched, so they aren't streamed progressively
+        progressive = st.session_state.get('progressive_playback') and preset['progressive_format']
+        if progressive and not section:
+            variant = video_cache.cache_variant(preset['progressive_format'], cookies_path)
+            video_path = video_cache.lookup(video_id, variant)
+            if video_path and play_video(video, video_path, media_url(video_path), 'cache hit', started_at):
+                st.rerun(scope=rerun_scope)
             
-            # Create video player with proper controls
-            video_file = open(video_path, 'rb')
-            video_bytes = video_file.read()
-            video_file.close()
+            def on_complete(output_path):
+                # Keep the finished remux in the shared cache and repoint the player's URL at it
+                cached_path = video_cache.commit(video_id, variant, output_path)
+                lease.acquire(cached_path)
+                media_server.relink(output_path, cached_path)
+                # The remux has left the scratch directory, so stop tracking it there
+                temp_file_manager.cleanup_file(output_path)
+                return cached_path
             
-            st.video(video_bytes)
-            
-            # Add video information below player
-            st.markdown(f"""
-            **Now Playing:** {video['title']}  
-            **Channel:** {video['channel']}  
-            **Published:** {video['published_at']}
-            """)
+            stream = stream_progressively(
+                video_id, temp_file_manager, cookies_path, on_complete, preset['progressive_format']
+            )
+            if stream:
+                st.session_state.progressive_streams[stream.output_path] = stream
+                video_url = media_url(stream.output_path, is_growing=stream.is_growing)
+                play_video(video, stream.output_path, video_url, 'progressive', started_at)
+                st.rerun(scope=rerun_scope)
+        
+        variant = video_cache.cache_variant(preset['format'], cookies_path, section)
+        video_path = video_cache.lookup(video_id, variant, preset['ext'])
+        if video_path and play_video(
+            video, video_path, media_url(video_path), 'cache hit', started_at, preset['audio_only']
+        ):
+            get_prefetcher().claim(video_id, variant)
+            st.rerun(scope=rerun_scope)
+        
+        queue_download(video, 'stream', temp_file_manager, cookies_path, quality, section)
             
     except Exception as e:
         logger.error(f"Error streaming video: {str(e)}")
         st.error("Failed to stream video. Please try again.")
 
 def handle_video_download(video, temp_file_manager, cookies_path=None):
-    """Handle video download with proper error handling"""
+    """Offer a cached video for download, or queue a background download of it"""
+    if not media_base_url():
+        show_media_unreachable()
+        return
     try:
-        video_path = download_and_stream_video(video['video_id'], temp_file_manager, cookies_path)
-        if video_path:
-            with open(video_path, "rb") as file:
-                file_stats = os.stat(video_path)
-                if file_stats.st_size == 0:
-                    st.error("Downloaded file is empty. Please try again.")
-                    return
-                
-                st.download_button(
-                    label="📥 Download Now",
-                    data=file,
-                    file_name=f"{video['title']}.mp4",
-                    mime="video/mp4",
-                    key=f"download_button_{video['video_id']}"
-                )
+        video_cache = get_video_cache()
+        quality = selected_quality()
+        preset = QUALITY_PRESETS[quality]
+        section = selected_clip()
+        video = clip_video(video, section)
+        variant = video_cache.cache_variant(preset['format'], cookies_path, section)
+        video_path = video_cache.lookup(video['video_id'], variant, preset['ext'])
+        if video_path and add_ready_download(video, video_path):
+            get_prefetcher().claim(video['video_id'], variant)
+            st.rerun()
+        queue_download(video, 'download', temp_file_manager, cookies_path, quality, section)
     except Exception as e:
         logger.error(f"Error downloading video: {str(e)}")
         st.error("Failed to download video. Please try again.")
 
+def queue_download(video, action, temp_file_manager, cookies_path=None, quality=DEFAULT_QUALITY, section=None):
+    """Submit a download (of the whole video, or of section only) to the worker pool and track it in this session"""
+    already_queued = any(
+        entry['video']['video_id'] == video['video_id'] and entry['action'] == action and entry['quality'] == quality
+        and entry['section'] == section
+        for entry in st.session_state.download_jobs
+    )
+    if already_queued:
+        return
+    
+    preset = QUALITY_PRESETS[quality]
+    job = get_download_pool().submit(
+        video['video_id'], temp_file_manager, cookies_path, format_selector=preset['format'], ext=preset['ext'],
+        section=section
+    )
+    st.session_state.download_jobs.append({
+        'job': job,
+        'action': action,
+        'quality': quality,
+        'section': section,
+        'video': video,
+        'started_at': time.time(),
+    })
+    st.rerun()
+
+@st.fragment(run_every=1)
+def show_download_jobs():
+    """Poll this session's background downloads without rerunning the whole page"""
+    for entry in st.session_state.download_jobs:
+        job = entry['job']
+        icon = "▶" if entry['action'] == 'stream' else "⬇"
+        status = job.state
+        if job.total_bytes:
+            status += f" • {job.downloaded_bytes / 1024 ** 2:.1f} / {job.total_bytes / 1024 ** 2:.1f} MB"
+        if job.speed and job.state == 'downloading':
+            status += f" • {job.speed / 1024 ** 2:.1f} MB/s"
+        
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.progress(job.progress, text=f"{icon} {entry['video']['title']} ({entry['quality']}) — {status}")
+        with col2:
+            if job.is_active and st.button("✖ Cancel", key=f"cancel_{entry['action']}_{job.job_id}"):
+                get_download_pool().cancel(job)
+                entry['cancelled'] = True
+    
+    # Finished jobs are picked up by a full rerun, which renders the player or download button
+    if any(not entry['job'].is_active or entry.get('cancelled') for entry in st.session_state.download_jobs):
+        st.rerun()
+
+def collect_finished_jobs():
+    """Turn this session's finished background downloads into playback or download buttons"""
+    still_running = []
+    for entry in st.session_state.download_jobs:
+        job = entry['job']
+        video = entry['video']
+        if entry.get('cancelled'):
+            continue
+        if job.is_active:
+            still_running.append(entry)
+        elif job.state == 'done' and entry['action'] == 'stream':
+            if not play_video(
+                video, job.video_path, media_url(job.video_path),
+                'clip' if entry['section'] else 'full download',
+                entry['started_at'], QUALITY_PRESETS[entry['quality']]['audio_only']
+            ):
+                st.error(f"{video['title']} was evicted from the cache before it could play. Please try again.")
+        elif job.state == 'done':
+            if not add_ready_download(video, job.video_path):
+                st.error(f"{video['title']} was evicted from the cache before it was offered. Please try again.")
+        elif job.state == 'failed':
+            st.error(f"Error downloading {video['title']}: {job.error}")
+    st.session_state.download_jobs = still_running
+
+def play_video(video, video_path, video_url, mode, started_at, audio_only=False):
+    """Make video_path this session's current video, releasing the one it replaces.
+
+    Returns False, changing nothing, if video_path was evicted from the cache
+    since it was looked up or downloaded.
+    """
+    previous = st.session_state.current_video
+    if video_path != previous:
+        if get_video_cache().owns(video_path) and not st.session_state.cache_lease.acquire(video_path):
+            return False
+        if previous:
+            release_video(previous, st.session_state.temp_file_manager)
+    
+    st.session_state.current_video = video_path
+    st.session_state.now_playing = {'video': video, 'url': video_url, 'audio_only': audio_only}
+    get_playback_stats().record(
+        mode,
+        parse_duration_seconds(video.get('duration')),
+        time.time() - started_at
+    )
+    get_metrics().observe('chuntube_time_to_first_frame_seconds', time.time() - started_at, mode=mode)
+    return True
+
+def show_player():
+    """Render the current video, streamed from the media server"""
+    now_playing = st.session_state.now_playing
+    if not now_playing:
+        return
+    
+    video = now_playing['video']
+    # Hand the player a URL on the media server so the file is streamed
+    # from disk with Range support instead of loaded into memory
+    if not now_playing['url']:
+        show_media_unreachable()
+    elif now_playing.get('audio_only'):
+        st.audio(now_playing['url'])
+    else:
+        st.video(now_playing['url'])
+    
+    # Add video information below player
+    st.markdown(f"""
+    **Now Playing:** {video['title']}  
+    **Channel:** {video['channel']}  
+    **Published:** {video['published_at']}
+    """)
+
+def release_video(video_path, temp_file_manager):
+    """Drop this session's hold on a video it was playing"""
+    stream = st.session_state.progressive_streams.pop(video_path, None)
+    if stream:
+        stream.stop()
+        # A completed remux has been moved into the cache
+        video_path = stream.output_path
+    
+    get_media_server().revoke(video_path)
+    if get_video_cache().owns(video_path):
+        st.session_state.cache_lease.release(video_path)
+    else:
+        temp_file_manager.cleanup_file(video_path)
+
+def add_ready_download(video, video_path):
+    """Offer video_path for download; returns False if it was evicted from the cache meanwhile"""
+    # Clips of a video are offered next to each other and to the whole video
+    key = f"{video['video_id']}@{video['clip']}" if video.get('clip') else video['video_id']
+    if key not in st.session_state.ready_downloads:
+        if not st.session_state.cache_lease.acquire(video_path):
+            return False
+        st.session_state.ready_downloads[key] = (video, video_path)
+    return True
+
+def dismiss_download(key):
+    _, video_path = st.session_state.ready_downloads.pop(key)
+    if video_path != st.session_state.current_video:
+        get_media_server().revoke(video_path)
+    st.session_state.cache_lease.release(video_path)
+
+def show_ready_downloads():
+    """Render a download link for every finished download in this session.
+
+    The link points at the media server, which streams the file from disk
+    with Range support, so downloads cost no app memory and can be resumed.
+    """
+    for key, (video, video_path) in list(st.session_state.ready_downloads.items()):
+        if os.path.getsize(video_path) == 0:
+            st.error("Downloaded file is empty. Please try again.")
+            dismiss_download(key)
+            continue
+        
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            url = media_url(video_path, download_name=video['title'])
+            if url:
+                st.link_button(f"📥 Download Now: {video['title']}", url)
+            else:
+                show_media_unreachable()
+        with col2:
+            st.button("✖ Dismiss", key=f"dismiss_download_{key}", on_click=dismiss_download, args=(key,))
+
+@st.cache_resource(show_spinner=False)
+def get_youtube_client(api_keys):
+    """Build the API client once per set of keys; it is shared by every session using them"""
+    started_at = time.perf_counter()
+    services = {
+        api_key: build(
+            'youtube', 'v3', developerKey=api_key, cache=DiscoveryCache(),
+            client_options={'api_endpoint': API_ENDPOINT} if API_ENDPOINT else None
+        )
+        for api_key in api_keys
+    }
+    build_seconds = time.perf_counter() - started_at
+    logger.info(f"Built YouTube API client for {len(services)} key(s) in {build_seconds:.3f}s")
+    return YouTubeClient(services, get_api_cache(), get_http_pool(), build_seconds)
+
 def setup_youtube_api(api_key):
-    """Initialize YouTube API client."""
+    """Initialize YouTube API client from one or more comma-separated keys."""
     try:
-        youtube = build('youtube', 'v3', developerKey=api_key, cache=MemoryCache())
-        return youtube
+        return get_youtube_client(tuple(key for key in re.split(r'[\s,]+', api_key) if key))
     except Exception as e:
         st.error(f"Error initializing YouTube API: {str(e)}")
         return None
 
-def search_channels(youtube, query, max_results=2):
-    """Search for channels using YouTube API."""
-    try:
-        request = youtube.search().list(
-            q=query,
-            part='snippet',
-            type='channel',
-            maxResults=max_results
-        )
-        response = request.execute()
-        
-        channels = []
-        for item in response['items']:
-            channel_data = {
-                'title': item['snippet']['title'],
-                'channel_id': item['snippet']['channelId'],
-                'thumbnail': item['snippet']['thumbnails']['default']['url'],
-                'description': item['snippet']['description']
-            }
-            channels.append(channel_data)
-        
-        return channels
-    except Exception as e:
-        st.error(f"Error searching channels: {str(e)}")
-        return []
+def search_channels(youtube, query, max_results=2, index=None):
+    """Search for channels using YouTube API; raises on failure."""
+    response = youtube.list(
+        'search',
+        q=query,
+        part='snippet',
+        type='channel',
+        maxResults=max_results
+    )
+    
+    channels = []
+    for item in response['items']:
+        channel_data = {
+            'title': item['snippet']['title'],
+            'channel_id': item['snippet']['channelId'],
+            'thumbnail': best_thumbnail(item['snippet']['thumbnails']),
+            'description': item['snippet']['description']
+        }
+        channels.append(channel_data)
+    
+    if index:
+        index.add_channels(channels)
+    return channels
+
+@st.cache_resource
+def get_search_executor():
+    """Thread pool shared by all sessions for concurrent API calls"""
+    return ThreadPoolExecutor(max_workers=SEARCH_FANOUT_WORKERS, thread_name_prefix='search-fanout')
+
+def timed_call(fn, *args):
+    started_at = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started_at
+
+def fetch_search_results(youtube, query, video_pager, channel_pager=None, index=None):
+    """Run the channel search, video search and channel video fetch concurrently.
+
+    Each branch chains its own videos.list detail call, so the page waits for
+    the slowest branch instead of the sum of all of them. The video branches
+    load the first page of their pagers. Returns the results per branch, a
+    timings dict with each branch's latency and the wall time, and the error
+    of each branch that failed (its results are then empty).
+    """
+    branches = {
+        'channels': (search_channels, youtube, query, 2, index),
+        'videos': (video_pager.first_page,),
+    }
+    if channel_pager:
+        branches['channel videos'] = (channel_pager.first_page,)
+    
+    started_at = time.perf_counter()
+    executor = get_search_executor()
+    futures = {name: executor.submit(timed_call, *call) for name, call in branches.items()}
+    
+    results = {}
+    timings = {}
+    errors = {}
+    for name, future in futures.items():
+        try:
+            results[name], timings[name] = future.result()
+        except Exception as e:
+            logger.error(f"Error in {name} search for {query!r}: {str(e)}")
+            results[name], errors[name] = [], str(e)
+    for name, pager in (('videos', video_pager), ('channel videos', channel_pager)):
+        if pager and pager.error and not pager.pages:
+            errors[name] = pager.error
+    timings['wall'] = time.perf_counter() - started_at
+    logger.info(f"Search for {query!r} took {timings['wall']:.2f}s wall, branches: " + ", ".join(
+        f"{name} {seconds:.2f}s" for name, seconds in timings.items() if name != 'wall'
+    ))
+    return results, timings, errors
+
+def search_local_index(youtube, index, query, channel_id=None):
+    """Answer a search from the local index, in the shape fetch_search_results returns (it never fails).
+
+    Only stale statistics cost quota, one unit per 50 videos.
+    """
+    started_at = time.perf_counter()
+    results = {
+        'channels': index.search_channels(query),
+        'videos': index.search_videos(query),
+    }
+    if channel_id:
+        results['channel videos'] = index.channel_videos(channel_id)
+    timings = {'local index': time.perf_counter() - started_at}
+    refresh_statistics(youtube, index, [video for name in ('videos', 'channel videos') for video in results.get(name, [])])
+    timings['wall'] = time.perf_counter() - started_at
+    return results, timings, {}
+
+@st.fragment
+def show_results(results, video_pager=None, channel_pager=None, cookies_path=None):
+    """The player and the search results.
+
+    This is a fragment: Stream and the other buttons on the cards rerun
+    only this part of the page, not the searches, inputs and stats, and
+    Load more reruns only the page it adds.
+    """
+    show_player()
+    if not results:
+        return
+    temp_file_manager = st.session_state.temp_file_manager
+    
+    # Display channels in a grid layout
+    channels = results['channels']
+    if channels:
+        st.subheader("Channels")
+        cols = st.columns(2)
+        for idx, channel in enumerate(channels):
+            with cols[idx % 2]:
+                st.markdown(channel_html(channel, media_base_url()), unsafe_allow_html=True)
+                
+                # Add button to fetch latest videos from the channel
+                if st.button(f"View Latest Videos", key=f"channel_{channel['channel_id']}"):
+                    st.session_state.selected_channel = channel['channel_id']
+                    st.rerun()
+    
+    # Display videos
+    videos = results['videos']
+    if videos:
+        st.subheader("Videos")
+        show_video_grid(videos, 0, "search", temp_file_manager, cookies_path)
+        if video_pager:
+            show_more_results(video_pager, "search", temp_file_manager, cookies_path)
+    
+    # If a channel is selected, show its latest videos
+    channel_videos = results.get('channel videos')
+    if st.session_state.selected_channel and channel_videos:
+        st.subheader("Latest Videos from Channel")
+        show_video_grid(channel_videos, 0, "channel", temp_file_manager, cookies_path)
+        if channel_pager:
+            show_more_results(channel_pager, "channel", temp_file_manager, cookies_path)
 
 def main():
     st.set_page_config(
@@ -457,28 +3453,39 @@ def main():
         layout="wide",
         initial_sidebar_state="collapsed"
     )
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
     
     # Initialize session state
     if 'temp_file_manager' not in st.session_state:
         st.session_state.temp_file_manager = TempFileManager()
     if 'current_video' not in st.session_state:
         st.session_state.current_video = None
-    if 'previous_video' not in st.session_state:
-        st.session_state.previous_video = None
+    if 'now_playing' not in st.session_state:
+        st.session_state.now_playing = None
+    if 'download_jobs' not in st.session_state:
+        st.session_state.download_jobs = []
+    if 'ready_downloads' not in st.session_state:
+        st.session_state.ready_downloads = {}
+    if 'progressive_streams' not in st.session_state:
+        st.session_state.progressive_streams = {}
+    if 'cache_lease' not in st.session_state:
+        st.session_state.cache_lease = CacheLease(get_video_cache())
     if 'selected_channel' not in st.session_state:
         st.session_state.selected_channel = None
-    
-    # Clean up previous video if exists
-    if st.session_state.previous_video:
-        st.session_state.temp_file_manager.cleanup_file(st.session_state.previous_video)
-        st.session_state.previous_video = None
+    if 'search_timings' not in st.session_state:
+        st.session_state.search_timings = None
+    if 'pagers' not in st.session_state:
+        st.session_state.pagers = {}
+    if 'last_search' not in st.session_state:
+        st.session_state.last_search = None
     
     # API Key input with password mask
     api_key = st.text_input(
         "Enter your YouTube Data API Key",
         type="password",
-        help="Get your API key from Google Cloud Console"
-    )
+        help="Get your API key from Google Cloud Console. Separate several keys with commas "
+             "to switch to the next one when a key runs out of quota."
+    ) or API_KEYS
     
     if not api_key:
         st.warning("Please enter your YouTube Data API key to continue.")
@@ -501,7 +3508,7 @@ def main():
     # Save uploaded cookies file to temp directory
     cookies_path = None
     if cookies_file is not None:
-        cookies_path = os.path.join(st.session_state.temp_file_manager.temp_dir, 'cookies.txt')
+        cookies_path = st.session_state.temp_file_manager.create_temp_file('cookies', 'txt')
         with open(cookies_path, 'wb') as f:
             f.write(cookies_file.getvalue())
     
@@ -512,56 +3519,369 @@ def main():
     
     # Search interface
     search_query = st.text_input("Search for videos and channels", "")
+    st.toggle(
+        "Progressive playback",
+        key='progressive_playback',
+        help="Start playing while the video is still downloading (needs ffmpeg)"
+    )
+    st.toggle(
+        "Search offline",
+        key='local_search',
+        help="Search only videos and channels the app has fetched before, without spending API quota "
+             "(views and likes older than a day are still refreshed, 1 unit per 50 videos)"
+    )
+    st.toggle(
+        "Prefetch top results",
+        key='prefetch',
+        help="Quietly download the first few results in the background so they start instantly"
+    )
+    st.selectbox(
+        "Quality",
+        ['Auto', *QUALITY_PRESETS],
+        key='quality',
+        format_func=lambda option: f"Auto ({pick_quality(client_throughput())})" if option == 'Auto' else option,
+        help="Auto picks the best resolution your connection kept up with on earlier videos"
+    )
+    clip = st.text_input(
+        "Clip (optional)",
+        key='clip',
+        placeholder="1:30-4:00",
+        help="Stream or download just this part of a video, fetching only its bytes (needs ffmpeg). "
+             "Clips start at the keyframe at or before the start time, so they may begin a moment early."
+    )
+    try:
+        parse_clip(clip)
+    except ValueError as e:
+        st.error(f"Clip ignored: {e}")
     
+    # Background downloads and finished downloads for this session
+    collect_finished_jobs()
+    if st.session_state.download_jobs:
+        show_download_jobs()
+    show_ready_downloads()
+    
+    results = video_pager = channel_pager = None
     if search_query:
-        # Fetch channels first
-        with st.spinner("Searching channels..."):
-            channels = search_channels(youtube, search_query)
+        index = get_metadata_index()
+        local_search = bool(st.session_state.get('local_search'))
+        if not local_search:
+            video_pager = get_pager(('search', search_query), youtube, {'q': search_query}, VIDEO_PAGE_SIZE)
+            if st.session_state.selected_channel:
+                channel_pager = get_pager(
+                    ('channel', st.session_state.selected_channel),
+                    youtube,
+                    {'channelId': st.session_state.selected_channel, 'order': 'date'},
+                    CHANNEL_VIDEO_PAGE_SIZE
+                )
+            # Forget pagers of earlier searches
+            st.session_state.pagers = {
+                key: pager for key, pager in st.session_state.pagers.items()
+                if pager in (video_pager, channel_pager)
+            }
         
-        # Display channels in a grid layout
-        if channels:
-            st.subheader("Channels")
-            cols = st.columns(2)
-            for idx, channel in enumerate(channels):
-                with cols[idx % 2]:
-                    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
-                    st.markdown(f'<div class="channel-thumbnail-container">', unsafe_allow_html=True)
-                    st.image(
-                        channel['thumbnail'],
-                        use_container_width=False,
-                        caption=channel['title']
+        # Reruns for anything but a new search (toggles, finished downloads) reuse the results
+        search_key = (search_query, st.session_state.selected_channel, local_search)
+        if st.session_state.last_search and st.session_state.last_search[0] == search_key:
+            results = st.session_state.last_search[1]
+        else:
+            if local_search:
+                results, st.session_state.search_timings, errors = search_local_index(
+                    youtube, index, search_query, st.session_state.selected_channel
+                )
+            else:
+                # Channels, videos and the selected channel's videos are fetched
+                # concurrently; show what the local index knows while they load
+                preview = st.empty()
+                known_videos = index.search_videos(search_query, VIDEO_PAGE_SIZE)
+                if known_videos:
+                    with preview.container():
+                        st.caption("Seen before, while fresh results load...")
+                        show_video_preview(known_videos)
+                with st.spinner("Searching..."):
+                    results, st.session_state.search_timings, errors = fetch_search_results(
+                        youtube, search_query, video_pager, channel_pager, index
                     )
-                    st.markdown('</div>', unsafe_allow_html=True)
-                    st.write(f"Description: {channel['description']}")
-                    
-                    # Add button to fetch latest videos from the channel
-                    if st.button(f"View Latest Videos", key=f"channel_{channel['channel_id']}"):
-                        st.session_state.selected_channel = channel['channel_id']
-                        st.rerun()
-
-        # Search videos with combined details
-        with st.spinner("Searching videos..."):
-            videos = search_videos_with_details(youtube, search_query)
-        
-        # Display videos
-        if videos:
-            st.subheader("Videos")
-            cols = st.columns(2)
-            for idx, video in enumerate(videos):
-                with cols[idx % 2]:
-                    display_video_card(video, idx, "search", st.session_state.temp_file_manager, cookies_path)
-        
-        # If a channel is selected, fetch its videos with combined details
-        if st.session_state.selected_channel:
-            with st.spinner("Fetching channel videos..."):
-                channel_videos = get_channel_videos_with_details(youtube, st.session_state.selected_channel)
+                preview.empty()
+            if errors:
+                # Not remembered, so the next rerun (or Retry) searches again
+                st.warning("Some results couldn't be loaded: " + "; ".join(
+                    f"{name} ({error})" for name, error in errors.items()
+                ))
+                st.button("🔄 Retry", key='retry_search')
+            else:
+                st.session_state.last_search = (search_key, results)
             
-            if channel_videos:
-                st.subheader("Latest Videos from Channel")
-                cols = st.columns(2)
-                for idx, video in enumerate(channel_videos):
-                    with cols[idx % 2]:
-                        display_video_card(video, idx, "channel", st.session_state.temp_file_manager, cookies_path)
+            # Result cards fetch their thumbnails when first rendered; channels aren't cached as HTML
+            if media_base_url():
+                get_thumbnail_cache().prefetch(
+                    [channel['thumbnail'] for channel in results['channels']], get_search_executor()
+                )
+        if video_pager and youtube.quota_exhausted():
+            st.error("Every API key is out of quota for today. Searches you've already run still work from the cache.")
+    
+    show_results(results, video_pager, channel_pager, cookies_path)
+    
+    with st.expander("📊 Stats"):
+        latency = get_metrics().percentiles()
+        if latency:
+            st.caption(f"Latency (Prometheus metrics at {media_base_url() or get_media_server().public_url}/metrics)")
+            st.table(latency)
+        playback_summary = get_playback_stats().summary()
+        if playback_summary:
+            st.caption("Playback timings")
+            st.table(playback_summary)
+        video_cache = get_video_cache()
+        st.caption("Video cache")
+        st.table([{**video_cache.stats, **video_cache.usage()}])
+        conversion_summary = get_conversion_stats().summary()
+        if conversion_summary:
+            st.caption("Conversions")
+            st.table(conversion_summary)
+        clip_summary = get_clip_stats().summary()
+        if clip_summary:
+            st.caption("Clips (latency is the clip phase above, next to full downloads)")
+            st.table(clip_summary)
+        if st.session_state.search_timings:
+            st.caption("Last search (seconds per branch, wall = whole fan-out)")
+            st.table([{name: round(seconds, 3) for name, seconds in st.session_state.search_timings.items()}])
+        thumbnail_stats = get_thumbnail_cache().stats
+        lookups = thumbnail_stats['hits'] + thumbnail_stats['misses']
+        st.caption("Thumbnails")
+        st.table([{
+            **thumbnail_stats,
+            'bytes_served': get_media_server().bytes_sent.get('thumbnail', 0),
+            'hit_rate': round(thumbnail_stats['hits'] / lookups, 3) if lookups else None,
+        }])
+        st.caption("API client")
+        st.table([youtube.stats()])
+        st.caption("API cache")
+        st.table([get_api_cache().stats])
+        st.caption("Rendered result pages")
+        st.table([get_render_cache().stats])
+        index = get_metadata_index()
+        st.caption("Local index")
+        st.table([{**index.size(), **index.stats}])
+        st.caption("API quota (today, resets at midnight Pacific time)")
+        st.table(youtube.quota_summary())
+        st.caption("Downloads")
+        st.table([{**get_download_pool().stats, **get_download_flights().stats}])
+        scratch = get_scratch_storage()
+        st.caption("Scratch space (unfinished downloads and leftovers)")
+        st.table([{**scratch.usage(), **scratch.stats}])
+        st.caption("Prefetch (hit rate = prefetched videos that got watched)")
+        st.table([get_prefetcher().summary()])
+        throughput = client_throughput()
+        if throughput:
+            st.caption(f"Measured client throughput: {throughput / 1e6:.1f} Mbit/s")
+    
+    # Videos to prefetch for what's on screen now; an empty list cancels the last search's
+    prefetch_candidates = []
+    if results:
+        prefetch_candidates += results['videos'][:PREFETCH_TOP_RESULTS]
+        if st.session_state.selected_channel:
+            prefetch_candidates += results.get('channel videos', [])[:1]
+    
+    get_prefetcher().update(
+        st.session_state.temp_file_manager.temp_dir,
+        prefetch_candidates if st.session_state.get('prefetch') else [],
+        st.session_state.temp_file_manager,
+        cookies_path,
+        selected_quality()
+    )
+
+def batch_lines(lines):
+    """Items in a batch input file: one per line, skipping blank lines and # comments"""
+    return [line.strip() for line in lines if line.strip() and not line.startswith('#')]
+
+def classify_batch_item(item):
+    """Tell a batch item apart as ('video', id), ('channel', id) or ('query', text).
+
+    Explicit "video:", "channel:" and "search:" prefixes win. Otherwise watch
+    URLs and 11-character IDs are videos (all-lowercase words like
+    "programming" are taken as searches) and UC... IDs are channels.
+    """
+    kind, _, value = item.partition(':')
+    if kind in ('video', 'channel') and value:
+        return kind, value.strip()
+    if kind == 'search' and value:
+        return 'query', value.strip()
+    match = re.search(r'(?:[?&]v=|youtu\.be/|/shorts/)([A-Za-z0-9_-]{11})', item)
+    if match:
+        return 'video', match.group(1)
+    match = re.search(r'(?:^|/channel/)(UC[A-Za-z0-9_-]{22})$', item)
+    if match:
+        return 'channel', match.group(1)
+    if re.fullmatch(r'[A-Za-z0-9_-]{11}', item) and not item.islower():
+        return 'video', item
+    return 'query', item
+
+class BatchManifest:
+    """JSON record of a batch run, rewritten after every change so a rerun resumes it.
+
+    'items' maps each input item to the video IDs it resolved to, so reruns
+    don't spend quota resolving channels and queries again; 'videos' holds
+    each video's title, state and output file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.data = {'items': {}, 'videos': {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data = json.load(f)
+
+    def save(self):
+        staging = f"{self.path}.tmp"
+        with open(staging, 'w') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(staging, self.path)
+
+def resolve_batch_items(items, youtube, manifest, per_item):
+    """Resolve channels and queries to video IDs and fill in titles, recording both in the manifest"""
+    videos = manifest.data['videos']
+    for item in items:
+        if item in manifest.data['items']:
+            continue
+        kind, value = classify_batch_item(item)
+        if kind == 'video':
+            video_ids = [value]
+        elif youtube is None:
+            raise SystemExit(f"An API key is needed to resolve {item!r} (use --api-key or CHUNTUBE_API_KEYS)")
+        else:
+            params = {'channelId': value, 'order': 'date'} if kind == 'channel' else {'q': value}
+            page = fetch_video_page(youtube, {**params, 'maxResults': per_item})
+            for video in page['videos']:
+                videos.setdefault(video['video_id'], {'title': video['title'], 'state': 'pending'})
+            video_ids = [video['video_id'] for video in page['videos']]
+        for video_id in video_ids:
+            videos.setdefault(video_id, {'title': None, 'state': 'pending'})
+        manifest.data['items'][item] = video_ids
+        logger.info(f"Resolved {item!r} to {len(video_ids)} video(s)")
+    
+    untitled = [video_id for video_id, entry in videos.items() if not entry['title']]
+    if untitled and youtube is not None:
+        for video_id, details in fetch_video_details(youtube, untitled).items():
+            videos[video_id]['title'] = details.get('snippet', {}).get('title')
+    manifest.save()
+
+def export_video(cached_path, output_dir, title, video_id):
+    """Link (or copy) a cached video into output_dir under a readable name"""
+    ext = os.path.splitext(cached_path)[1].lstrip('.')
+    output_path = os.path.join(output_dir, safe_filename(f"{title} [{video_id}]" if title else video_id, ext))
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    try:
+        os.link(cached_path, output_path)
+    except OSError:
+        shutil.copyfile(cached_path, output_path)
+    return output_path
+
+def batch_main(argv=None):
+    """Download videos, channels' latest uploads and search results from the command line"""
+    parser = argparse.ArgumentParser(
+        prog='python -m app batch',
+        description="Download videos with the app's download engine, without the UI. "
+                    "Rerunning with the same manifest resumes where the last run stopped."
+    )
+    parser.add_argument('items', nargs='*', help='video IDs or URLs, channel IDs (UC...) or search queries')
+    parser.add_argument('-i', '--input', help='file with one item per line, "-" for stdin')
+    parser.add_argument('-o', '--output', default='downloads', help='directory for the downloaded files')
+    parser.add_argument(
+        '-q', '--quality', default=DEFAULT_QUALITY, choices=list(QUALITY_PRESETS), metavar='QUALITY',
+        help=f"one of {', '.join(QUALITY_PRESETS)} (default {DEFAULT_QUALITY})"
+    )
+    parser.add_argument('-j', '--parallel', type=int, default=DOWNLOAD_WORKERS, help='simultaneous downloads')
+    parser.add_argument('-n', '--per-item', type=int, default=5, help='videos to take from each channel or search')
+    parser.add_argument('--manifest', help='job manifest for resuming (default: OUTPUT/manifest.json)')
+    parser.add_argument('--report', help='also write the final report to this JSON file')
+    parser.add_argument('--api-key', default=API_KEYS, help='API key(s), comma separated (default: CHUNTUBE_API_KEYS)')
+    parser.add_argument('--cookies', help='cookies.txt for age-restricted or private videos')
+    parser.add_argument('--clip', help='only fetch this part of every video, as START-END (e.g. 1:30-4:00; needs ffmpeg)')
+    args = parser.parse_args(argv)
+    try:
+        section = parse_clip(args.clip)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    items = list(args.items)
+    if args.input == '-':
+        # Not in a with block: that would close the process's stdin
+        items += batch_lines(sys.stdin)
+    elif args.input:
+        with open(args.input) as f:
+            items += batch_lines(f)
+    os.makedirs(args.output, exist_ok=True)
+    manifest = BatchManifest(args.manifest or os.path.join(args.output, 'manifest.json'))
+    if not items and not manifest.data['items']:
+        parser.error("nothing to download")
+    
+    youtube = None
+    if args.api_key:
+        youtube = get_youtube_client(tuple(key for key in re.split(r'[\s,]+', args.api_key) if key))
+    resolve_batch_items(items, youtube, manifest, args.per_item)
+    
+    preset = QUALITY_PRESETS[args.quality]
+    temp_file_manager = TempFileManager()
+    pool = DownloadWorkerPool(workers=args.parallel, per_host_limit=args.parallel)
+    started_at = time.time()
+    jobs = {}
+    skipped = 0
+    for video_id, entry in manifest.data['videos'].items():
+        if entry['state'] == 'done' and entry.get('path') and os.path.exists(entry['path']):
+            skipped += 1
+            continue
+        jobs[video_id] = pool.submit(
+            video_id, temp_file_manager, args.cookies, format_selector=preset['format'], ext=preset['ext'],
+            section=section
+        )
+    print(f"{len(jobs)} to download, {skipped} already done", file=sys.stderr)
+    
+    downloaded_bytes = 0
+    errors = {}
+    try:
+        for finished, (video_id, job) in enumerate(jobs.items(), 1):
+            job.done.wait()
+            entry = manifest.data['videos'][video_id]
+            if job.state == 'done':
+                title = f"{entry['title']} [{clip_label(section)}]" if section and entry['title'] else entry['title']
+                entry['path'] = export_video(job.video_path, args.output, title, video_id)
+                entry['bytes'] = os.path.getsize(job.video_path)
+                entry['seconds'] = round(job.finished_at - job.started_at, 2)
+                entry['state'] = 'done'
+                entry.pop('error', None)
+                downloaded_bytes += entry['bytes']
+            else:
+                entry['state'] = 'failed'
+                entry['error'] = job.error or job.state
+                errors[video_id] = entry['error']
+            manifest.save()
+            print(f"[{finished}/{len(jobs)}] {entry['state']}: {entry['title'] or video_id}", file=sys.stderr)
+    except KeyboardInterrupt:
+        for job in jobs.values():
+            pool.cancel(job)
+        manifest.save()
+        print("Interrupted; run the same command again to resume", file=sys.stderr)
+        return 130
+    finally:
+        temp_file_manager.cleanup_all()
+    
+    wall_seconds = time.time() - started_at
+    report = {
+        'videos': len(manifest.data['videos']),
+        'downloaded': len(jobs) - len(errors),
+        'skipped': skipped,
+        'failed': len(errors),
+        'bytes': downloaded_bytes,
+        'wall_seconds': round(wall_seconds, 2),
+        'throughput_mb_per_s': round(downloaded_bytes / 1024 ** 2 / wall_seconds, 2) if wall_seconds else None,
+        'errors': errors,
+    }
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if errors else 0
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ['batch']:
+        sys.exit(batch_main(sys.argv[2:]))
     main()
@@ -0,0 +1,374 @@
+"""End-to-end benchmark of ChunTube against local YouTube stand-ins.
+
+Points the app at a fake Data API v3 server (with injectable latency) and a
+local media server that yt-dlp's generic extractor downloads from, then
+measures search latency, page render latency, time to first frame, download
+throughput, clip extraction against a full download, and peak RSS. Page renders run against a real `streamlit run`
+server, driven over its websocket by 1, 10 and 50 concurrent browser
+sessions, and on a 50-card result grid the cost of a full rerun, of Load more
+and of a Stream click is measured in time and websocket payload. Results are
+JSON, so two runs can be compared:
+
+    python benchmarks/bench_app.py --output before.json
+    python benchmarks/bench_app.py --output after.json
+    python benchmarks/bench_app.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetStates
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(os.path.dirname(BENCH_DIR), 'app.py')
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from stand_ins import FakeYouTubeApiHandler, fake_video_id, start_fake_youtube_api, start_media_server  # noqa: E402
+
+WORK_DIR = tempfile.mkdtemp(prefix='chuntube_bench_')
+SEARCH_LABEL = 'Search for videos and channels'
+STREAM_LABEL = '▶ Stream'
+LOAD_MORE_LABEL = 'Load more'
+GRID_QUERY = 'card grid'
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else None
+
+def latency_summary(seconds):
+    return {
+        'count': len(seconds),
+        'p50_ms': round(percentile(seconds, 0.5) * 1000, 1),
+        'p95_ms': round(percentile(seconds, 0.95) * 1000, 1),
+        'max_ms': round(max(seconds) * 1000, 1),
+    }
+
+def bench_search(app, youtube, queries):
+    """fetch_search_results per query, first against the API and then from the response cache"""
+    index = app.get_metadata_index()
+    results = {}
+    for phase in ('cold', 'warm'):
+        seconds = []
+        for query in queries:
+            pager = app.ResultPager(youtube, {'q': query}, app.VIDEO_PAGE_SIZE, index)
+            _, timings, _ = app.fetch_search_results(youtube, query, pager, index=index)
+            seconds.append(timings['wall'])
+        results[phase] = latency_summary(seconds)
+    return results
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_app_server(env):
+    """Run the app under `streamlit run` and wait until it answers health checks"""
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', APP_PATH, '--server.headless', 'true',
+         '--server.address', '127.0.0.1', '--server.port', str(port), '--browser.gatherUsageStats', 'false'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while True:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health')
+            return server, port
+        except OSError:
+            if time.time() > deadline or server.poll() is not None:
+                server.kill()
+                raise RuntimeError("The app server didn't start")
+            time.sleep(0.2)
+
+async def rerun(websocket, widget_states=None, fragment_id=''):
+    """Ask for a script (or fragment) run like the browser does.
+
+    Returns the seconds until the run finished, how many ForwardMsgs and
+    bytes came back, and the text inputs and buttons drawn, by label, as
+    (widget id, fragment id) pairs.
+    """
+    message = BackMsg()
+    message.rerun_script.query_string = ''
+    message.rerun_script.page_script_hash = ''
+    message.rerun_script.fragment_id = fragment_id
+    if widget_states:
+        message.rerun_script.widget_states.CopyFrom(widget_states)
+    started_at = time.perf_counter()
+    await websocket.send(message.SerializeToString())
+    render = {'messages': 0, 'bytes': 0, 'widgets': {}}
+    while True:
+        data = await websocket.recv()
+        render['messages'] += 1
+        render['bytes'] += len(data)
+        reply = ForwardMsg()
+        reply.ParseFromString(data)
+        kind = reply.WhichOneof('type')
+        element_type = reply.delta.new_element.WhichOneof('type') if kind == 'delta' else None
+        if element_type in ('text_input', 'button'):
+            element = getattr(reply.delta.new_element, element_type)
+            render['widgets'].setdefault(element.label, []).append((element.id, reply.delta.fragment_id))
+        elif element_type == 'exception':
+            # Don't time an error page
+            raise RuntimeError(f"The app raised: {reply.delta.new_element.exception.message}")
+        elif kind == 'script_finished' and reply.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+            render['seconds'] = time.perf_counter() - started_at
+            return render
+
+def browser_state(search_box_id, query, clicked_id=None):
+    """Widget states a browser sends: the search box filled in, and maybe one button clicked"""
+    states = WidgetStates()
+    widget = states.widgets.add()
+    widget.id = search_box_id
+    widget.string_value = query
+    if clicked_id:
+        widget = states.widgets.add()
+        widget.id = clicked_id
+        widget.trigger_value = True
+    return states
+
+def render_cost(render):
+    return {'ms': round(render['seconds'] * 1000, 1), 'messages': render['messages'], 'kb': round(render['bytes'] / 1024, 1)}
+
+async def search_session(port, query):
+    """Open the page like a browser tab, type query into the search box and time that rerun"""
+    async with websockets.connect(f'ws://127.0.0.1:{port}/_stcore/stream', max_size=None) as websocket:
+        search_box_id = (await rerun(websocket))['widgets'][SEARCH_LABEL][0][0]
+        return await rerun(websocket, browser_state(search_box_id, query))
+
+async def concurrent_sessions(port, queries):
+    return await asyncio.gather(*(search_session(port, query) for query in queries))
+
+def bench_sessions(port, session_counts):
+    """Render the search page in N concurrent sessions of one server, each with its own query"""
+    results = {}
+    for sessions in session_counts:
+        started_at = time.perf_counter()
+        renders = asyncio.run(concurrent_sessions(port, [f"session {sessions}-{i}" for i in range(sessions)]))
+        results[str(sessions)] = {
+            **latency_summary([render['seconds'] for render in renders]),
+            'wall_seconds': round(time.perf_counter() - started_at, 3),
+            'messages_per_render': renders[0]['messages'],
+            'kb_per_render': round(renders[0]['bytes'] / 1024, 1),
+        }
+    return results
+
+async def card_grid(port, cards):
+    """Grow the results to `cards` cards with Load more, then time a full rerun and a Stream click"""
+    async with websockets.connect(f'ws://127.0.0.1:{port}/_stcore/stream', max_size=None) as websocket:
+        search_box_id = (await rerun(websocket))['widgets'][SEARCH_LABEL][0][0]
+        page = await rerun(websocket, browser_state(search_box_id, GRID_QUERY))
+        load_more = None
+        while len(page['widgets'].get(STREAM_LABEL, [])) < cards and LOAD_MORE_LABEL in page['widgets']:
+            button_id, fragment_id = page['widgets'][LOAD_MORE_LABEL][0]
+            page = load_more = await rerun(websocket, browser_state(search_box_id, GRID_QUERY, button_id), fragment_id)
+        full_rerun = await rerun(websocket, browser_state(search_box_id, GRID_QUERY))
+        # The first result is in the video cache, so this is the instant-playback path
+        button_id, fragment_id = full_rerun['widgets'][STREAM_LABEL][0]
+        stream_click = await rerun(websocket, browser_state(search_box_id, GRID_QUERY, button_id), fragment_id)
+    return {
+        'cards': len(full_rerun['widgets'].get(STREAM_LABEL, [])),
+        'full_rerun': render_cost(full_rerun),
+        'load_more': render_cost(load_more) if load_more else None,
+        'stream_click': render_cost(stream_click),
+    }
+
+def first_bytes(url, size=64 * 1024):
+    with urllib.request.urlopen(urllib.request.Request(url, headers={'Range': f'bytes=0-{size - 1}'})) as response:
+        return len(response.read())
+
+def bench_time_to_first_frame(app, media_url, runs):
+    """Click to first media byte at the browser, for a fresh download and a cache hit.
+
+    Progressive playback isn't covered: it needs real YouTube formats and ffmpeg.
+    """
+    pool = app.get_download_pool()
+    video_cache = app.get_video_cache()
+    media_server = app.get_media_server()
+    temp_file_manager = app.TempFileManager()
+    results = {'download': [], 'cache_hit': []}
+    for i in range(runs):
+        video_id = f'ttff-{os.getpid()}-{i}'
+        started_at = time.perf_counter()
+        job = pool.submit(video_id, temp_file_manager, url=media_url, format_selector='best')
+        job.done.wait()
+        if job.state != 'done':
+            raise RuntimeError(job.error)
+        first_bytes(media_server.publish(job.video_path))
+        results['download'].append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        cached = video_cache.lookup(video_id, video_cache.cache_variant('best', None))
+        first_bytes(media_server.publish(cached))
+        results['cache_hit'].append(time.perf_counter() - started_at)
+    temp_file_manager.cleanup_all()
+    return {name: latency_summary(seconds) for name, seconds in results.items()}
+
+def bench_clip(app, video_seconds, clip_seconds):
+    """Fetch a clip from the middle of a generated video and the whole video, and compare the two.
+
+    The video is served by the app's media server, which answers the Range
+    requests ffmpeg seeks with. Skipped when ffmpeg is missing.
+    """
+    if not shutil.which('ffmpeg'):
+        return {'skipped': 'needs ffmpeg'}
+    source_path = os.path.join(WORK_DIR, 'long.mp4')
+    subprocess.run(
+        ['ffmpeg', '-loglevel', 'error', '-y',
+         '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={video_seconds}',
+         '-f', 'lavfi', '-i', f'sine=frequency=440:duration={video_seconds}',
+         '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60', '-b:v', '2M', '-c:a', 'aac',
+         '-movflags', '+faststart', source_path],
+        check=True
+    )
+    url = app.get_media_server().publish(source_path)
+    pool = app.get_download_pool()
+    temp_file_manager = app.TempFileManager()
+    start = (video_seconds - clip_seconds) / 2
+    results = {}
+    for name, section in (('full', None), ('clip', (start, start + clip_seconds))):
+        started_at = time.perf_counter()
+        job = pool.submit(f'clip-bench-{os.getpid()}', temp_file_manager, url=url, format_selector='best',
+                          section=section)
+        job.done.wait()
+        if job.state != 'done':
+            raise RuntimeError(job.error)
+        results[name] = {
+            'seconds': round(time.perf_counter() - started_at, 3),
+            'mb': round(os.path.getsize(job.video_path) / 1024 ** 2, 2),
+        }
+    temp_file_manager.cleanup_all()
+    results['video_seconds'] = video_seconds
+    results['clip_seconds'] = clip_seconds
+    results['bytes_ratio'] = round(results['clip']['mb'] / results['full']['mb'], 3)
+    return results
+
+def peak_rss_mb(pid=None):
+    """Peak resident set size of this process, or of another process on Linux"""
+    if pid:
+        with open(f'/proc/{pid}/status') as f:
+            peak_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+        return round(peak_kb / 1024, 1)
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024, 1)
+
+def run(args):
+    api = start_fake_youtube_api(args.api_latency_ms)
+    media_dir = os.path.join(WORK_DIR, 'media')
+    os.makedirs(media_dir)
+    with open(os.path.join(media_dir, 'clip.mp4'), 'wb') as f:
+        f.write(os.urandom(args.size_mb * 1024 ** 2))
+    media = start_media_server(media_dir, args.rate_mbps)
+    # The app reads its configuration once at import, so set it up before importing it
+    os.environ.update({
+        'CHUNTUBE_API_ENDPOINT': f'http://127.0.0.1:{api.server_address[1]}',
+        'CHUNTUBE_API_KEYS': 'benchmark-key',
+        'CHUNTUBE_DATA_DIR': os.path.join(WORK_DIR, 'data'),
+        'CHUNTUBE_CACHE_DIR': os.path.join(WORK_DIR, 'cache'),
+        'CHUNTUBE_API_DAILY_QUOTA': str(10 ** 9),
+    })
+    import app
+    import bench_download_pool
+
+    # Put the grid's first result in the shared video cache, so clicking Stream on it plays at once
+    video_cache = app.get_video_cache()
+    seed_path = os.path.join(WORK_DIR, 'seed.mp4')
+    with open(seed_path, 'wb') as f:
+        f.write(os.urandom(1024 ** 2))
+    video_cache.commit(
+        fake_video_id(GRID_QUERY, 0), video_cache.cache_variant(app.QUALITY_PRESETS[app.DEFAULT_QUALITY]['format']),
+        seed_path
+    )
+
+    server, port = start_app_server(dict(os.environ, CHUNTUBE_DATA_DIR=os.path.join(WORK_DIR, 'server_data')))
+    try:
+        page_render = bench_sessions(port, args.sessions)
+        grid = asyncio.run(card_grid(port, args.grid_cards))
+        server_peak_rss = peak_rss_mb(server.pid) if sys.platform == 'linux' else None
+    finally:
+        server.terminate()
+        server.wait()
+
+    youtube = app.get_youtube_client(('benchmark-key',))
+    report = {
+        'config': {
+            'api_latency_ms': args.api_latency_ms,
+            'size_mb': args.size_mb,
+            'rate_mbps_per_connection': args.rate_mbps,
+            'sessions': args.sessions,
+            'grid_cards': args.grid_cards,
+        },
+        'search': bench_search(app, youtube, [f'query {i}' for i in range(args.queries)]),
+        'page_render': page_render,
+        'card_grid': grid,
+        'time_to_first_frame': bench_time_to_first_frame(
+            app, f'http://127.0.0.1:{media.server_address[1]}/clip.mp4', args.ttff_runs
+        ),
+        'downloads': bench_download_pool.run(
+            args.download_jobs, app.DOWNLOAD_WORKERS, app.DOWNLOAD_HOST_LIMIT, args.size_mb, args.rate_mbps
+        ),
+        'clip': bench_clip(app, args.clip_video_seconds, args.clip_seconds),
+        'api_calls': dict(FakeYouTubeApiHandler.calls),
+    }
+    report['peak_rss_mb'] = {'app_server': server_peak_rss, 'benchmark': peak_rss_mb()}
+    api.shutdown()
+    media.shutdown()
+    return report
+
+def flatten(report, prefix=''):
+    for key, value in report.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f'{prefix}{key}.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f'{prefix}{key}', value
+
+def compare(before_path, after_path):
+    """Print every numeric metric of two reports side by side with the relative change"""
+    with open(before_path) as f:
+        before = dict(flatten(json.load(f)))
+    with open(after_path) as f:
+        after = dict(flatten(json.load(f)))
+    width = max(map(len, before | after))
+    for name in sorted(before | after):
+        old, new = before.get(name), after.get(name)
+        change = f'{(new - old) / old:+.1%}' if old and new is not None else ''
+        print(f'{name:<{width}}  {old!s:>12}  {new!s:>12}  {change:>8}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--api-latency-ms', type=float, default=80, help="delay added to every API response")
+    parser.add_argument('--queries', type=int, default=10)
+    parser.add_argument('--sessions', type=lambda value: [int(n) for n in value.split(',')], default=[1, 10, 50],
+                        metavar='N[,N...]', help="concurrent session counts to render (default: 1,10,50)")
+    parser.add_argument('--grid-cards', type=int, default=50, help="cards to load before timing reruns and clicks")
+    parser.add_argument('--ttff-runs', type=int, default=5)
+    parser.add_argument('--download-jobs', type=int, default=8)
+    parser.add_argument('--size-mb', type=int, default=8)
+    parser.add_argument('--rate-mbps', type=float, default=40, help="per-connection cap, 0 for unthrottled")
+    parser.add_argument('--clip-video-seconds', type=int, default=600, help="length of the video clips are cut from")
+    parser.add_argument('--clip-seconds', type=int, default=30)
+    parser.add_argument('--output', help="also write the JSON report here")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="compare two reports and exit")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Throughput benchmark for the background download worker pool.
+
+Serves synthetic media files from a local stand-in media server and downloads
+them concurrently through DownloadWorkerPool, using yt-dlp's generic
+extractor. Each connection can be throttled to mimic a CDN, so the effect of
+the worker and per-host limits shows up in the aggregate throughput.
+
+    python benchmarks/bench_download_pool.py --jobs 8 --workers 4 --host-limit 2 --size-mb 16 --rate-mbps 40
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+from stand_ins import start_media_server  # noqa: E402
+
+def run(jobs, workers, host_limit, size_mb, rate_mbps):
+    work_dir = tempfile.mkdtemp(prefix='chuntube_bench_')
+    media_dir = os.path.join(work_dir, 'media')
+    os.makedirs(media_dir)
+    for i in range(jobs):
+        with open(os.path.join(media_dir, f'clip{i}.mp4'), 'wb') as f:
+            f.write(os.urandom(size_mb * 1024 ** 2))
+
+    httpd = start_media_server(media_dir, rate_mbps)
+    base_url = f'http://127.0.0.1:{httpd.server_address[1]}'
+    video_cache = app.VideoCache(os.path.join(work_dir, 'cache'), max_bytes=2 * jobs * size_mb * 1024 ** 2)
+    pool = app.DownloadWorkerPool(workers, host_limit, video_cache, app.SingleFlight())
+    temp_file_manager = app.TempFileManager()
+
+    started_at = time.time()
+    submitted = [
+        pool.submit(f'bench-{i}', temp_file_manager, url=f'{base_url}/clip{i}.mp4', format_selector='best')
+        for i in range(jobs)
+    ]
+    for job in submitted:
+        job.done.wait()
+    elapsed = time.time() - started_at
+    httpd.shutdown()
+
+    total_bytes = sum(os.path.getsize(job.video_path) for job in submitted if job.state == 'done')
+    job_seconds = sorted(job.finished_at - job.created_at for job in submitted)
+    return {
+        'jobs': jobs,
+        'workers': workers,
+        'host_limit': host_limit,
+        'size_mb': size_mb,
+        'rate_mbps_per_connection': rate_mbps,
+        'succeeded': sum(job.state == 'done' for job in submitted),
+        'failed': [job.error for job in submitted if job.state != 'done'],
+        'wall_seconds': round(elapsed, 3),
+        'throughput_mb_per_second': round(total_bytes / 1024 ** 2 / elapsed, 2),
+        'median_job_seconds': round(job_seconds[len(job_seconds) // 2], 3),
+        'max_job_seconds': round(job_seconds[-1], 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=app.DOWNLOAD_WORKERS)
+    parser.add_argument('--host-limit', type=int, default=app.DOWNLOAD_HOST_LIMIT)
+    parser.add_argument('--size-mb', type=int, default=16)
+    parser.add_argument('--rate-mbps', type=float, default=40, help="per-connection cap, 0 for unthrottled")
+    args = parser.parse_args()
+    print(json.dumps(run(args.jobs, args.workers, args.host_limit, args.size_mb, args.rate_mbps), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Local stand-ins for YouTube that the benchmarks point the app at.
+
+FakeYouTubeApiHandler answers the Data API v3 search, videos and channels
+endpoints with canned, deterministic responses after an injectable delay,
+and serves their thumbnails. ThrottledMediaHandler serves media files that
+yt-dlp's generic extractor can download, optionally rate limited per
+connection to mimic a CDN.
+"""
+import hashlib
+import json
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Smallest valid GIF, served when Pillow isn't there to draw a thumbnail
+PLACEHOLDER_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+RESULTS_PER_QUERY = 50
+
+class ThrottledMediaHandler(SimpleHTTPRequestHandler):
+    """Static file handler that caps the transfer rate of each connection"""
+    rate_bytes_per_second = None
+
+    def copyfile(self, source, outputfile):
+        try:
+            if not self.rate_bytes_per_second:
+                return super().copyfile(source, outputfile)
+            chunk_size = 64 * 1024
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                outputfile.write(chunk)
+                time.sleep(len(chunk) / self.rate_bytes_per_second)
+        except (BrokenPipeError, ConnectionResetError):
+            # yt-dlp's generic extractor probes the URL and drops the connection
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def start_media_server(media_dir, rate_mbps):
+    handler = partial(ThrottledMediaHandler, directory=media_dir)
+    ThrottledMediaHandler.rate_bytes_per_second = rate_mbps * 1024 ** 2 / 8 if rate_mbps else None
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+def fake_video_id(seed, i):
+    """ID of the i-th result the fake API returns for a query or channel"""
+    return hashlib.sha256(f"{seed}|{i}".encode()).hexdigest()[:11]
+
+class FakeYouTubeApiHandler(BaseHTTPRequestHandler):
+    """Canned YouTube Data API v3 responses, delayed by latency_seconds each.
+
+    Searches return RESULTS_PER_QUERY videos per query (or per channel),
+    paged by maxResults with numeric page tokens. Every call is counted in
+    calls, per endpoint.
+    """
+    protocol_version = 'HTTP/1.1'
+    latency_seconds = 0.0
+    calls = {}
+    calls_lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        endpoint = 'thumbnails' if url.path.startswith('/thumb/') else url.path.rstrip('/').rsplit('/', 1)[-1]
+        with self.calls_lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+        if endpoint == 'thumbnails':
+            self._send(200, PLACEHOLDER_GIF, 'image/gif')
+            return
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if endpoint == 'search':
+            body = self._search(params)
+        elif endpoint == 'videos':
+            body = {'items': [self._video(video_id) for video_id in params.get('id', '').split(',') if video_id]}
+        elif endpoint == 'channels':
+            body = {'items': []}
+        else:
+            self._send(404, b'{"error": {"code": 404, "errors": [{"reason": "notFound"}]}}', 'application/json')
+            return
+        self._send(200, json.dumps(body).encode(), 'application/json')
+
+    def _thumbnails(self, item_id):
+        base = f"http://{self.headers.get('Host')}/thumb/{item_id}.gif"
+        return {size: {'url': base} for size in ('default', 'medium', 'high')}
+
+    def _snippet(self, video_id, channel_id):
+        return {
+            'title': f"Benchmark video {video_id}",
+            'channelId': channel_id,
+            'channelTitle': f"Channel {channel_id[-4:]}",
+            'description': "Canned result from the benchmark stand-in API",
+            'publishedAt': '2024-01-01T00:00:00Z',
+            'thumbnails': self._thumbnails(video_id),
+        }
+
+    def _search(self, params):
+        max_results = int(params.get('maxResults', 5))
+        if params.get('type') == 'channel':
+            channel_id = 'UC' + hashlib.sha256(params.get('q', '').encode()).hexdigest()[:22]
+            snippet = self._snippet(channel_id, channel_id)
+            return {'items': [{'id': {'channelId': channel_id}, 'snippet': snippet}][:max_results]}
+
+        seed = params.get('channelId') or params.get('q', '')
+        start = int(params.get('pageToken') or 0)
+        end = min(start + max_results, RESULTS_PER_QUERY)
+        items = [
+            {'id': {'videoId': fake_video_id(seed, i)}, 'snippet': self._snippet(fake_video_id(seed, i), params.get('channelId') or 'UCbenchmark')}
+            for i in range(start, end)
+        ]
+        return {'items': items, 'nextPageToken': str(end) if end < RESULTS_PER_QUERY else None}
+
+    def _video(self, video_id):
+        return {
+            'id': video_id,
+            'snippet': self._snippet(video_id, 'UCbenchmark'),
+            'contentDetails': {'duration': 'PT3M30S'},
+            'statistics': {'viewCount': '12345', 'likeCount': '678'},
+        }
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_youtube_api(latency_ms=0):
+    FakeYouTubeApiHandler.latency_seconds = latency_ms / 1000
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeYouTubeApiHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# app.py is a single module at the repository root; importing it sets up
+# logging, so point the log file somewhere outside the repository first
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('CHUNTUBE_LOG_FILE', os.path.join(tempfile.gettempdir(), 'chuntube_tests.log'))
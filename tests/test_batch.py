@@ -0,0 +1,24 @@
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize('item, expected', [
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ', ('video', 'dQw4w9WgXcQ')),
+    ('https://www.youtube.com/watch?list=PL1&v=dQw4w9WgXcQ', ('video', 'dQw4w9WgXcQ')),
+    ('https://youtu.be/dQw4w9WgXcQ', ('video', 'dQw4w9WgXcQ')),
+    ('https://www.youtube.com/shorts/dQw4w9WgXcQ', ('video', 'dQw4w9WgXcQ')),
+    ('dQw4w9WgXcQ', ('video', 'dQw4w9WgXcQ')),
+    ('UC_x5XG1OV2P6uZZ5FSM9Ttw', ('channel', 'UC_x5XG1OV2P6uZZ5FSM9Ttw')),
+    ('https://www.youtube.com/channel/UC_x5XG1OV2P6uZZ5FSM9Ttw', ('channel', 'UC_x5XG1OV2P6uZZ5FSM9Ttw')),
+    # All-lowercase 11-letter words are searches, not IDs
+    ('programming', ('query', 'programming')),
+    ('lofi hip hop', ('query', 'lofi hip hop')),
+    # Explicit prefixes win
+    ('video: abc', ('video', 'abc')),
+    ('channel:UCsomething', ('channel', 'UCsomething')),
+    ('search: dQw4w9WgXcQ', ('query', 'dQw4w9WgXcQ')),
+    ('video:', ('query', 'video:')),
+])
+def test_classify_batch_item(item, expected):
+    assert app.classify_batch_item(item) == expected
@@ -0,0 +1,30 @@
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1:30-4:00', (90.0, 240.0)),
+    ('90-240', (90.0, 240.0)),
+    (' 0:05 - 1:02:03 ', (5.0, 3723.0)),
+    ('1.5-2', (1.5, 2.0)),
+    ('', None),
+    ('   ', None),
+    (None, None),
+])
+def test_parse_clip(text, expected):
+    assert app.parse_clip(text) == expected
+
+
+@pytest.mark.parametrize('text, message', [
+    ('1:30', 'START-END'),
+    ('4:00-1:30', 'end after it starts'),
+    ('1:00-1:00', 'end after it starts'),
+    ('1:60-2:00', 'not a timestamp'),
+    ('0:00-1:2:3:4', 'not a timestamp'),
+    ('a-b', 'not a timestamp'),
+    ('-10', 'not a timestamp'),
+])
+def test_parse_clip_rejects(text, message):
+    with pytest.raises(ValueError, match=message):
+        app.parse_clip(text)
@@ -0,0 +1,95 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('', None),
+    ('bytes=0-99', (0, 99)),
+    ('bytes=100-', (100, 999)),
+    ('bytes=900-5000', (900, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=-5000', (0, 999)),
+    (' bytes=5-5 ', (5, 5)),
+    # Ignored: malformed, multi-range or other units
+    ('bytes=-', None),
+    ('bytes=0-10,20-30', None),
+    ('items=0-10', None),
+    ('bytes=a-b', None),
+])
+def test_parse_range_header(header, expected):
+    assert app.parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=1000-1200', 'bytes=50-10', 'bytes=-0'])
+def test_parse_range_header_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        app.parse_range_header(header, 1000)
+
+
+@pytest.fixture
+def media_server():
+    server = app.MediaServer(host='127.0.0.1', port=0, public_url=None, metrics=app.Metrics())
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(bytes(range(256)) * 4)
+    return path
+
+
+def fetch(url, **headers):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=5) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_range_request(media_server, video):
+    url = media_server.publish(str(video))
+    status, headers, body = fetch(url, Range='bytes=10-19')
+    assert status == 206
+    assert headers['Content-Range'] == 'bytes 10-19/1024'
+    assert body == video.read_bytes()[10:20]
+
+
+def test_unsatisfiable_range(media_server, video):
+    url = media_server.publish(str(video))
+    status, headers, body = fetch(url, Range='bytes=2000-')
+    assert status == 416
+    assert headers['Content-Range'] == 'bytes */1024'
+    assert body == b''
+
+
+def test_if_range_matching_etag_resumes(media_server, video):
+    url = media_server.publish(str(video))
+    _, headers, _ = fetch(url)
+    etag = headers['ETag']
+
+    status, headers, body = fetch(url, Range='bytes=1000-', **{'If-Range': etag})
+    assert status == 206
+    assert headers['Content-Range'] == 'bytes 1000-1023/1024'
+    assert body == video.read_bytes()[1000:]
+
+
+def test_if_range_stale_etag_sends_whole_file(media_server, video):
+    url = media_server.publish(str(video))
+    status, headers, body = fetch(url, Range='bytes=1000-', **{'If-Range': '"0-0"'})
+    assert status == 200
+    assert 'Content-Range' not in headers
+    assert body == video.read_bytes()
+
+
+def test_unpublished_token_is_not_found(media_server, video):
+    url = media_server.publish(str(video))
+    media_server.revoke(str(video))
+    status, _, _ = fetch(url)
+    assert status == 404
@@ -0,0 +1,28 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def title_index(tmp_path):
+    """An index searching titles with LIKE, as on SQLite builds without FTS5"""
+    index = app.MetadataIndex(str(tmp_path / 'index.sqlite3'))
+    index.fts = False
+    index.add_videos([
+        {'video_id': video_id, 'title': title, 'channel': 'c', 'description': ''}
+        for video_id, title in [
+            ('a', '100% free'), ('b', '100 free'), ('c', 'snake_case tips'), ('d', 'snakeXcase tips'),
+            ('e', 'C:\\path tricks'),
+        ]
+    ])
+    return index
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('100%', ['a']),
+    ('snake_case', ['c']),
+    ('\\path', ['e']),
+    ('free', ['a', 'b']),
+])
+def test_title_search_takes_wildcards_literally(title_index, query, expected):
+    assert sorted(video['video_id'] for video in title_index.search_videos(query)) == expected
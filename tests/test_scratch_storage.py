@@ -0,0 +1,101 @@
+import os
+import time
+
+import pytest
+
+import app
+
+
+def write_artifact(root, name, size):
+    path = os.path.join(root, name)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    return path
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path)
+
+
+def test_reserve_evicts_idle_artifacts_soonest_to_expire_first(root):
+    storage = app.ScratchStorage(root=root, max_bytes=1000, ttl=3600)
+    paths = {}
+    for name in ('a', 'b', 'c'):
+        paths[name] = write_artifact(root, f'{name}.part', 100)
+        storage.pin(paths[name])
+    # Unpinned in order, so a expires first and c last
+    for name in ('a', 'b', 'c'):
+        storage.unpin(paths[name])
+        time.sleep(0.01)
+
+    current = os.path.join(root, 'd.part')
+    storage.pin(current)
+    storage.reserve(current, 850)
+
+    assert not os.path.exists(paths['a'])
+    assert not os.path.exists(paths['b'])
+    assert os.path.exists(paths['c'])
+    assert storage.stats['evicted'] == 2
+    assert storage.usage()['bytes'] <= storage.max_bytes
+
+
+def test_reserve_refuses_when_pinned_artifacts_fill_the_budget(root):
+    storage = app.ScratchStorage(root=root, max_bytes=1000, ttl=3600)
+    in_use = write_artifact(root, 'in_use.part', 600)
+    storage.pin(in_use)
+
+    current = os.path.join(root, 'new.part')
+    storage.pin(current)
+    with pytest.raises(app.ScratchSpaceExhausted):
+        storage.reserve(current, 500)
+
+    # Pinned artifacts are never evicted, and the refused reservation isn't counted
+    assert os.path.exists(in_use)
+    assert storage.stats['refused'] == 1
+    assert storage.stats['evicted'] == 0
+    assert storage.usage()['bytes'] == 600
+
+
+def test_make_room_skips_artifacts_pinned_again(root):
+    storage = app.ScratchStorage(root=root, max_bytes=1000, ttl=3600)
+    reused = write_artifact(root, 'reused.part', 400)
+    idle = write_artifact(root, 'idle.part', 400)
+    storage.pin(reused)
+    storage.unpin(reused)
+    storage.pin(idle)
+    storage.unpin(idle)
+    # A retry resumes the first download; its stale expiry must not evict it
+    storage.pin(reused)
+
+    current = os.path.join(root, 'current.part')
+    storage.pin(current)
+    storage.reserve(current, 500)
+
+    assert os.path.exists(reused)
+    assert not os.path.exists(idle)
+    assert storage.stats['evicted'] == 1
+
+
+def test_janitor_expires_unpinned_artifacts(root):
+    storage = app.ScratchStorage(root=root, max_bytes=10_000, ttl=0.2)
+    expiring = write_artifact(root, 'expiring.part', 100)
+    pinned = write_artifact(root, 'pinned.part', 100)
+    storage.pin(expiring)
+    storage.pin(pinned)
+    storage.unpin(expiring)
+
+    assert wait_for(lambda: not os.path.exists(expiring))
+    assert storage.stats['expired'] == 1
+    time.sleep(0.3)
+    assert os.path.exists(pinned)
+    assert storage.usage() == {'artifacts': 1, 'bytes': 100, 'max_bytes': 10_000}
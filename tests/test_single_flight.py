@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+import app
+
+
+def test_followers_receive_the_leaders_exception():
+    flights = app.SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    error = RuntimeError("download failed")
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise error
+
+    leader_errors = []
+    leader = threading.Thread(target=_capture, args=(leader_errors, flights.do, 'video', failing))
+    leader.start()
+    assert started.wait(5)
+
+    follower_errors = []
+    followers = [threading.Thread(target=_capture, args=(follower_errors, flights.do, 'video', lambda: 'unused'))
+                 for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while flights.stats['coalesced'] < 3:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    for follower in followers:
+        follower.join(5)
+
+    assert leader_errors == [error]
+    assert follower_errors == [error] * 3
+    assert flights.stats == {'executions': 1, 'coalesced': 3}
+
+
+def test_failed_call_is_not_remembered():
+    flights = app.SingleFlight()
+
+    def failing():
+        raise ValueError("first attempt")
+
+    with pytest.raises(ValueError):
+        flights.do('video', failing)
+    assert flights.do('video', lambda: 'second attempt') == 'second attempt'
+    assert flights.stats == {'executions': 2, 'coalesced': 0}
+
+
+def _capture(errors, fn, *args):
+    try:
+        fn(*args)
+    except Exception as e:
+        errors.append(e)
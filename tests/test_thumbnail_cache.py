@@ -0,0 +1,42 @@
+import os
+
+import app
+
+
+def write_thumbnail(cache, name, size, mtime):
+    path = os.path.join(cache.cache_dir, name)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_evict_to_budget_drops_least_recently_used(tmp_path):
+    evicted = []
+    cache = app.ThumbnailCache(cache_dir=str(tmp_path), max_bytes=250, on_evict=evicted.append)
+    oldest = write_thumbnail(cache, 'a.webp', 100, 1000)
+    middle = write_thumbnail(cache, 'b.webp', 100, 2000)
+    newest = write_thumbnail(cache, 'c.webp', 100, 3000)
+
+    cache.evict_to_budget()
+
+    assert evicted == [oldest]
+    assert not os.path.exists(oldest)
+    assert os.path.exists(middle) and os.path.exists(newest)
+    assert cache.stats['evictions'] == 1
+    assert cache.stats['evicted_bytes'] == 100
+
+
+def test_hit_bumps_the_lru_clock(tmp_path):
+    cache = app.ThumbnailCache(cache_dir=str(tmp_path), max_bytes=250)
+    url = 'https://i.ytimg.com/vi/dQw4w9WgXcQ/mqdefault.jpg'
+    shown = write_thumbnail(cache, os.path.basename(cache.path_for(url)), 100, 1000)
+    other = write_thumbnail(cache, 'other.webp', 100, 2000)
+    write_thumbnail(cache, 'newest.webp', 100, 3000)
+
+    assert cache.get(url) == shown
+    cache.evict_to_budget()
+
+    assert os.path.exists(shown)
+    assert not os.path.exists(other)
+    assert cache.stats['hits'] == 1
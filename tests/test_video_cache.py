@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+
+import pytest
+
+import app
+
+# Cross-process pinning relies on flock
+fcntl = pytest.importorskip('fcntl')
+
+
+def make_cache(tmp_path, max_bytes=10_000):
+    return app.VideoCache(cache_dir=str(tmp_path / 'cache'), max_bytes=max_bytes, metrics=app.Metrics())
+
+
+def commit(cache, tmp_path, video_id, size):
+    source = tmp_path / f'{video_id}.download'
+    source.write_bytes(b'\0' * size)
+    return cache.commit(video_id, 'best', str(source))
+
+
+def test_pinned_entries_survive_eviction_from_another_process(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=250)
+    # A second instance stands in for another app process sharing the directory
+    other = make_cache(tmp_path, max_bytes=250)
+    pinned = commit(cache, tmp_path, 'a', 100)
+    assert other.acquire(pinned)
+    idle = commit(cache, tmp_path, 'b', 100)
+    os.utime(idle, (time.time() - 10, time.time() - 10))
+    os.utime(pinned, (time.time() - 20, time.time() - 20))
+
+    commit(cache, tmp_path, 'c', 100)
+
+    assert os.path.exists(pinned)
+    assert not os.path.exists(idle)
+
+
+def test_acquire_reports_an_evicted_entry(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=150)
+    entry = commit(cache, tmp_path, 'a', 100)
+    assert cache.lookup('a', 'best') == entry
+    # Evicted by the next commit between the lookup and the acquire
+    commit(cache, tmp_path, 'b', 100)
+
+    assert not cache.acquire(entry)
+    assert entry not in cache._refs
+
+
+def test_acquire_retries_when_the_lock_file_is_replaced(tmp_path):
+    cache = make_cache(tmp_path)
+    entry = commit(cache, tmp_path, 'a', 100)
+    lock_path = f'{entry}.lock'
+
+    # An evictor holds the entry's lock file exclusively...
+    evictor = open(lock_path, 'a')
+    fcntl.flock(evictor, fcntl.LOCK_EX)
+    acquired = []
+    reader = threading.Thread(target=lambda: acquired.append(cache.acquire(entry)))
+    reader.start()
+    time.sleep(0.2)
+    # ...unlinks it, and another process commits a new copy before it lets go
+    os.remove(lock_path)
+    commit(make_cache(tmp_path), tmp_path, 'a', 100)
+    evictor.close()
+    reader.join(5)
+
+    assert acquired == [True]
+    lock_file = cache._refs[entry][1]
+    assert os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino